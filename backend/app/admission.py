@@ -0,0 +1,261 @@
+"""
+Admission control for LLM calls.
+
+Nothing used to bound in-flight LLM work, so when the provider slowed down
+/api/intake/parse and /api/intake/evaluate requests piled up without limit.
+The controller here tracks, per worker:
+
+- how many LLM calls are in flight,
+- how many parse requests are queued waiting for a slot,
+- an exponentially weighted average of recent LLM latency.
+
+Parse requests wait for a slot in a bounded queue and are shed with
+`Overloaded` (-> HTTP 503 + Retry-After) when the queue is full, the wait
+times out, or the provider is slow.  Evaluate never waits: it asks
+`should_degrade()` and, when the answer is yes, returns the rule templates
+without LLM rewriting (rules-only mode).  Even when it goes ahead, each
+explanation call takes a slot with `try_slot()` and falls back to its rule
+template when none is free, so evaluate cannot push the number of in-flight
+calls past `max_in_flight`.
+
+Optional work (speculative evaluation) runs inside `optional_work()`: its
+calls only get a slot while at most half of `max_in_flight` is in use and
+nothing is queued, and otherwise raise `Overloaded` so the optional work is
+abandoned instead of competing with real requests.
+
+Batch work (bulk import) runs inside `wait_for_slots()`: its explanation
+calls wait for a free slot instead of falling back to the rule template,
+and do not back off when the provider is slow; a batch would rather be
+slow than degraded.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from .config import settings
+
+
+class Overloaded(Exception):
+    """Raised when an LLM request is shed; `retry_after` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Thread-safe in-flight / queue / latency bookkeeping for LLM calls."""
+
+    # 排队的 parse 请求多久检查一次是否有空位
+    POLL_INTERVAL = 0.05
+    # EWMA 平滑系数
+    LATENCY_ALPHA = 0.2
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float,
+        degrade_latency: float,
+        latency_window: float,
+        retry_after: int,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.degrade_latency = degrade_latency
+        self.latency_window = latency_window
+        self.retry_after = retry_after
+
+        self._lock = threading.Lock()
+        # 当前线程是否在跑可选的（推测执行的）工作
+        self._local = threading.local()
+        self._in_flight = 0
+        self._queued = 0
+        self._latency_ewma: Optional[float] = None
+        self._last_sample_at = 0.0
+        self._shed_count = 0
+        self._degraded_count = 0
+        self._fallback_count = 0
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        return cls(
+            max_in_flight=settings.llm_max_in_flight,
+            max_queue=settings.llm_max_queue,
+            queue_timeout=settings.llm_queue_timeout_seconds,
+            degrade_latency=settings.llm_degrade_latency_seconds,
+            latency_window=settings.llm_latency_window_seconds,
+            retry_after=settings.llm_retry_after_seconds,
+        )
+
+    # ----- internal helpers (call with self._lock held) -----
+
+    def _provider_slow(self) -> bool:
+        if self._latency_ewma is None:
+            return False
+        # 窗口内没有新样本（比如一直在 degraded 模式）→ 放行一次去试探 provider 是否恢复
+        if time.monotonic() - self._last_sample_at > self.latency_window:
+            return False
+        return self._latency_ewma > self.degrade_latency
+
+    def _record(self, latency: float) -> None:
+        self._in_flight -= 1
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma += self.LATENCY_ALPHA * (latency - self._latency_ewma)
+        self._last_sample_at = time.monotonic()
+
+    def _shed(self, reason: str) -> Overloaded:
+        self._shed_count += 1
+        return Overloaded(reason, self.retry_after)
+
+    # ----- public API -----
+
+    def should_degrade(self) -> bool:
+        """True when evaluate should skip LLM rewriting and return rule templates."""
+        with self._lock:
+            degrade = (
+                self._in_flight >= self.max_in_flight
+                or self._queued > 0
+                or self._provider_slow()
+            )
+            if degrade:
+                self._degraded_count += 1
+            return degrade
+
+    def has_spare_capacity(self) -> bool:
+        """True when optional LLM work (speculative evaluation) may run now."""
+        with self._lock:
+            return (
+                self._in_flight < self.max_in_flight // 2
+                and self._queued == 0
+                and not self._provider_slow()
+            )
+
+    @contextmanager
+    def optional_work(self) -> Iterator[None]:
+        """Mark LLM calls made by this thread as optional (see module docstring)."""
+        self._local.optional = True
+        try:
+            yield
+        finally:
+            self._local.optional = False
+
+    @contextmanager
+    def wait_for_slots(self) -> Iterator[None]:
+        """Make `try_slot()` calls by this thread wait for a slot (see module docstring)."""
+        self._local.wait = True
+        try:
+            yield
+        finally:
+            self._local.wait = False
+
+    @contextmanager
+    def try_slot(self) -> Iterator[bool]:
+        """
+        Take a free LLM slot without waiting and hold it for the call.
+
+        Yields False (and takes nothing) when no slot is free, parse requests
+        are queued or the provider is slow; the caller should then skip the
+        LLM call.  Inside `optional_work()` it raises `Overloaded` instead,
+        and only admits the call while half of the slots are free.  Inside
+        `wait_for_slots()` it blocks until a slot is free and always yields
+        True.
+        """
+        optional = getattr(self._local, "optional", False)
+        wait = getattr(self._local, "wait", False)
+        limit = self.max_in_flight // 2 if optional else self.max_in_flight
+        while True:
+            with self._lock:
+                admitted = (
+                    self._in_flight < limit
+                    and self._queued == 0
+                    and (wait or not self._provider_slow())
+                )
+                if admitted:
+                    self._in_flight += 1
+                elif not optional and not wait:
+                    self._fallback_count += 1
+            if admitted or not wait:
+                break
+            # 批量任务在工作线程里，阻塞等待不会卡住 event loop
+            time.sleep(self.POLL_INTERVAL)
+        if not admitted:
+            if optional:
+                raise Overloaded("No spare LLM capacity for optional work", self.retry_after)
+            yield False
+            return
+        started = time.monotonic()
+        try:
+            yield True
+        finally:
+            with self._lock:
+                self._record(time.monotonic() - started)
+
+    async def _reserve(self) -> None:
+        with self._lock:
+            if self._provider_slow():
+                raise self._shed("LLM provider is responding slowly")
+            if self._in_flight < self.max_in_flight and self._queued == 0:
+                self._in_flight += 1
+                return
+            if self._queued >= self.max_queue:
+                raise self._shed("Too many requests waiting for the LLM")
+            self._queued += 1
+
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            while True:
+                await asyncio.sleep(self.POLL_INTERVAL)
+                with self._lock:
+                    if self._in_flight < self.max_in_flight:
+                        self._in_flight += 1
+                        return
+                    if time.monotonic() >= deadline:
+                        raise self._shed("Timed out waiting for an LLM slot")
+        finally:
+            with self._lock:
+                self._queued -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Wait (bounded) for an LLM slot, then hold it for the duration of the call.
+
+        Raises `Overloaded` instead of waiting when the request should be shed.
+        """
+        await self._reserve()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._record(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "latency_ewma_seconds": (
+                    round(self._latency_ewma, 3) if self._latency_ewma is not None else None
+                ),
+                "provider_slow": self._provider_slow(),
+                "shed_count": self._shed_count,
+                "degraded_count": self._degraded_count,
+                "explanation_fallback_count": self._fallback_count,
+            }
+
+
+# 每个 worker 进程一个 controller
+admission = AdmissionController.from_settings()
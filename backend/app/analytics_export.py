@@ -0,0 +1,459 @@
+"""
+Columnar (Parquet) export of proof packages for audits and program analytics.
+
+Fairness reviews scan profile fields, fired rules, act sections,
+eligibility outcomes and ticket priority across every case.  Doing that over
+one nested JSON file per case is slow, so this module flattens proof
+packages (hot and archived tiers) into Parquet files laid out as a Hive-style
+partitioned dataset:
+
+    <analytics_dir>/cases/date=2025-01-31/service_id=EI_REGULAR/part-....parquet
+
+- one row per (case, recommended service); cases without recommendations
+  go to `service_id=none`;
+- each run appends only cases that have not been exported yet (tracked in
+  a SQLite manifest), writing one new part file per touched partition;
+- `compact` merges the part files of each partition into one, so repeated
+  small runs do not leave analysts with thousands of tiny files;
+- nothing here runs on the serving path; `export` and `compact` are meant
+  to run from one scheduled job at a time, like the proof archive.
+
+Analysts can read the dataset with any Arrow/Parquet engine, e.g.
+`pyarrow.dataset.dataset(path, partitioning="hive")` or DuckDB's
+`read_parquet('.../**/*.parquet', hive_partitioning=true)`, and get column
+pruning plus partition / row-group predicate pushdown.
+
+Requires pyarrow (`pip install pyarrow`), which the API itself does not need.
+
+Usage:
+
+    python -m app.analytics_export export
+    python -m app.analytics_export compact
+    python -m app.analytics_export stats
+    python -m app.analytics_export scan [--service EI_REGULAR] [--since 2025-01-01] [--band high]
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+from .config import settings
+
+PARQUET_COMPRESSION = "zstd"
+# 一次 export 最多在内存里攒多少行再写一批 part 文件
+EXPORT_BATCH_ROWS = 200_000
+NO_SERVICE = "none"
+
+_PROFILE_INT_FIELDS = ("age", "children_count", "youngest_child_age", "insurable_hours_last_52_weeks")
+_PROFILE_BOOL_FIELDS = ("is_single_parent", "has_disability", "needs_accommodation")
+_PROFILE_STR_FIELDS = (
+    "province",
+    "employment_status",
+    "unemployment_reason",
+    "preferred_language",
+    "residency_status",
+)
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS exported (
+    case_id TEXT PRIMARY KEY,
+    part    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parts (
+    part        TEXT PRIMARY KEY,
+    partition   TEXT NOT NULL,
+    rows        INTEGER NOT NULL,
+    created_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS parts_partition ON parts (partition);
+"""
+
+
+class AnalyticsExportError(RuntimeError):
+    """Raised when the export cannot run (e.g. pyarrow is not installed)."""
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise AnalyticsExportError(
+            "Analytics export needs pyarrow; install it with `pip install pyarrow`."
+        ) from exc
+    return pa, pq
+
+
+def _schema():
+    pa, _ = _arrow()
+    fields = [
+        pa.field("case_id", pa.string(), nullable=False),
+        pa.field("created_at", pa.timestamp("s", tz="UTC"), nullable=False),
+    ]
+    fields += [pa.field(name, pa.int32()) for name in _PROFILE_INT_FIELDS]
+    fields += [pa.field(name, pa.bool_()) for name in _PROFILE_BOOL_FIELDS]
+    fields += [pa.field(name, pa.string()) for name in _PROFILE_STR_FIELDS]
+    fields += [
+        pa.field("priority_score", pa.float64()),
+        pa.field("priority_band", pa.string()),
+        pa.field("requires_human_review", pa.bool_()),
+        pa.field("priority_reasons", pa.list_(pa.string())),
+        pa.field("degraded_mode", pa.bool_()),
+        pa.field("service_name", pa.string()),
+        pa.field("eligibility_status", pa.string()),
+        pa.field("program_id", pa.string()),
+        pa.field("rule_ids", pa.list_(pa.string())),
+        pa.field("act_sections", pa.list_(pa.string())),
+    ]
+    return pa.schema(fields)
+
+
+def dataset_dir() -> Path:
+    return Path(settings.analytics_dir) / "cases"
+
+
+def _manifest_path() -> Path:
+    return Path(settings.analytics_dir) / "manifest.sqlite"
+
+
+def _connect() -> sqlite3.Connection:
+    path = _manifest_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA_SQL)
+    return conn
+
+
+# --------------------------------------------------------------------------
+# Flattening
+# --------------------------------------------------------------------------
+
+
+def flatten(created: datetime, package: Dict[str, Any]) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    """Yield (service_id, row) per recommendation of one proof package."""
+    profile = package.get("case_profile") or {}
+    priority = package.get("ticket_priority") or {}
+
+    base: Dict[str, Any] = {
+        "case_id": package.get("case_id") or package.get("proof_package_id"),
+        "created_at": created.astimezone(timezone.utc).replace(microsecond=0),
+    }
+    for name in _PROFILE_INT_FIELDS + _PROFILE_BOOL_FIELDS + _PROFILE_STR_FIELDS:
+        base[name] = profile.get(name)
+    base.update(
+        priority_score=priority.get("score"),
+        priority_band=priority.get("band"),
+        requires_human_review=priority.get("requires_human_review"),
+        priority_reasons=priority.get("reasons") or [],
+        degraded_mode=bool(package.get("degraded_mode", False)),
+    )
+
+    recs = package.get("recommendations") or []
+    if not recs:
+        yield NO_SERVICE, dict(
+            base, service_name=None, eligibility_status=None, program_id=None, rule_ids=[], act_sections=[]
+        )
+        return
+
+    for rec in recs:
+        sources = rec.get("open_data_sources") or {}
+        yield rec.get("service_id") or NO_SERVICE, dict(
+            base,
+            service_name=rec.get("service_name"),
+            eligibility_status=rec.get("eligibility_status"),
+            program_id=sources.get("program_id"),
+            # 旧 package 里没有 rule_ids
+            rule_ids=sources.get("rule_ids") or [],
+            act_sections=sources.get("act_sections") or [],
+        )
+
+
+def _partition(created: datetime, service_id: str) -> str:
+    day = created.astimezone(timezone.utc).date().isoformat()
+    return f"date={day}/service_id={service_id}"
+
+
+# --------------------------------------------------------------------------
+# Export / compact
+# --------------------------------------------------------------------------
+
+
+def _stamp() -> str:
+    """UTC run timestamp that starts part names, so they sort by time."""
+    return time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+
+
+def _tmp_path(final: Path) -> Path:
+    # 以 "." 开头：pyarrow / DuckDB 扫描数据集时会跳过，没写完的 part 不会被读到
+    return final.with_name(f".{final.name}.tmp")
+
+
+def _final_path(tmp: Path) -> Path:
+    return tmp.with_name(tmp.name[1:-len(".tmp")])
+
+
+def _recover(conn: sqlite3.Connection) -> None:
+    """
+    Bring the files in line with the manifest after a crashed run: finish
+    renaming registered temp parts, drop unregistered ones, and remove part
+    files a committed compaction had not deleted yet.
+    """
+    known = {row[0] for row in conn.execute("SELECT part FROM parts")}
+    for tmp in dataset_dir().glob("**/.*.parquet.tmp"):
+        final = _final_path(tmp)
+        # 已经在位的 part 永远不覆盖：登记过且文件存在，说明 rename 早就做完了
+        if final.relative_to(dataset_dir()).as_posix() in known and not final.exists():
+            os.replace(tmp, final)
+        else:
+            tmp.unlink()
+    for path in dataset_dir().glob("**/*.parquet"):
+        if path.relative_to(dataset_dir()).as_posix() not in known:
+            path.unlink()
+
+
+def _part_name(partition: str, stamp: str, suffix: str = "") -> str:
+    # stamp 让文件名按时间排序；uuid 保证同一秒里的多次运行（同一个进程也一样）不会重名
+    return f"{partition}/part-{stamp}-{uuid4().hex}{suffix}.parquet"
+
+
+def _write_part(partition: str, rows: List[Dict[str, Any]], stamp: str) -> Tuple[str, Path]:
+    pa, pq = _arrow()
+    part = _part_name(partition, stamp)
+    final = dataset_dir() / part
+    final.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(final)
+    table = pa.Table.from_pylist(rows, schema=_schema())
+    pq.write_table(table, tmp, compression=PARQUET_COMPRESSION)
+    return part, tmp
+
+
+def _commit_batch(
+    conn: sqlite3.Connection,
+    by_partition: Dict[str, List[Dict[str, Any]]],
+    case_partitions: Dict[str, List[str]],
+    stamp: str,
+) -> int:
+    written: Dict[str, Tuple[str, Path]] = {}
+    for partition, rows in sorted(by_partition.items()):
+        written[partition] = _write_part(partition, rows, stamp)
+
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    with conn:
+        conn.executemany(
+            "INSERT INTO parts VALUES (?, ?, ?, ?)",
+            [(part, p, len(by_partition[p]), now) for p, (part, _) in written.items()],
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO exported VALUES (?, ?)",
+            [(case_id, written[parts[0]][0]) for case_id, parts in case_partitions.items()],
+        )
+    for _, tmp in written.values():
+        os.replace(tmp, _final_path(tmp))
+    return len(written)
+
+
+def export(packages: Optional[Iterable[Tuple[datetime, Dict[str, Any]]]] = None) -> Dict[str, Any]:
+    """
+    Append every not-yet-exported case to the dataset.
+
+    Rows are buffered up to EXPORT_BATCH_ROWS.  Each batch's part files are
+    written as hidden .tmp files (which dataset scans skip), registered in
+    the manifest together with their case ids in one transaction, and only
+    then renamed into place, so a crash never exports a case twice or loses
+    it.
+    """
+    _arrow()  # fail fast with a clear message
+    conn = _connect()
+    try:
+        _recover(conn)
+        if packages is None:
+            from .proof_archive import iter_proofs
+
+            exported = {row[0] for row in conn.execute("SELECT case_id FROM exported")}
+            packages = iter_proofs(exclude=exported)
+
+        run_stamp = _stamp()
+        cases = rows = parts = batch = 0
+        buffered = 0
+        by_partition: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        case_partitions: Dict[str, List[str]] = defaultdict(list)
+
+        for created, package in packages:
+            for service_id, row in flatten(created, package):
+                partition = _partition(created, service_id)
+                by_partition[partition].append(row)
+                case_partitions[row["case_id"]].append(partition)
+                buffered += 1
+            # 一个 case 的所有行总是落在同一批里
+            if buffered >= EXPORT_BATCH_ROWS:
+                parts += _commit_batch(conn, by_partition, case_partitions, f"{run_stamp}-{batch}")
+                cases += len(case_partitions)
+                rows += buffered
+                batch += 1
+                buffered = 0
+                by_partition.clear()
+                case_partitions.clear()
+
+        if buffered:
+            parts += _commit_batch(conn, by_partition, case_partitions, f"{run_stamp}-{batch}")
+            cases += len(case_partitions)
+            rows += buffered
+
+        return {"cases": cases, "rows": rows, "parts": parts}
+    finally:
+        conn.close()
+
+
+def compact(min_parts: int = 2) -> Dict[str, int]:
+    """Merge the part files of every partition that has at least `min_parts`."""
+    pa, pq = _arrow()
+    conn = _connect()
+    merged_partitions = removed = 0
+    try:
+        _recover(conn)
+        rows = conn.execute(
+            "SELECT partition, part FROM parts WHERE partition IN "
+            "(SELECT partition FROM parts GROUP BY partition HAVING COUNT(*) >= ?) "
+            "ORDER BY partition, part",
+            (min_parts,),
+        ).fetchall()
+        groups: Dict[str, List[str]] = defaultdict(list)
+        for partition, part in rows:
+            groups[partition].append(part)
+
+        stamp = _stamp()
+        for partition, parts in sorted(groups.items()):
+            table = pa.concat_tables(
+                [pq.read_table(dataset_dir() / p, schema=_schema()) for p in parts]
+            )
+            new_part = _part_name(partition, stamp, "-compacted")
+            final = dataset_dir() / new_part
+            tmp = _tmp_path(final)
+            pq.write_table(table, tmp, compression=PARQUET_COMPRESSION)
+
+            now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            with conn:
+                conn.executemany("DELETE FROM parts WHERE part = ?", [(p,) for p in parts])
+                conn.execute(
+                    "INSERT INTO parts VALUES (?, ?, ?, ?)",
+                    (new_part, partition, table.num_rows, now),
+                )
+                conn.executemany(
+                    "UPDATE exported SET part = ? WHERE part = ?", [(new_part, p) for p in parts]
+                )
+            os.replace(tmp, final)
+            for p in parts:
+                (dataset_dir() / p).unlink(missing_ok=True)
+            merged_partitions += 1
+            removed += len(parts)
+    finally:
+        conn.close()
+    return {"partitions_compacted": merged_partitions, "parts_merged": removed}
+
+
+# --------------------------------------------------------------------------
+# Reading
+# --------------------------------------------------------------------------
+
+
+def scan(
+    service_id: Optional[str] = None,
+    since: Optional[str] = None,
+    band: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+):
+    """
+    Read the dataset with partition pruning and Parquet predicate pushdown;
+    returns a pyarrow.Table.
+    """
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    if not dataset_dir().exists():
+        raise AnalyticsExportError("Nothing exported yet; run `python -m app.analytics_export export`.")
+
+    pa, _ = _arrow()
+    # 分区列按字符串读：ISO 日期按字典序比较就是按时间比较
+    partitioning = ds.partitioning(
+        pa.schema([("date", pa.string()), ("service_id", pa.string())]), flavor="hive"
+    )
+    dataset = ds.dataset(dataset_dir(), format="parquet", partitioning=partitioning)
+    expr = None
+    for cond in (
+        pc.field("service_id") == service_id if service_id else None,
+        pc.field("date") >= since if since else None,
+        pc.field("priority_band") == band if band else None,
+    ):
+        if cond is not None:
+            expr = cond if expr is None else expr & cond
+    return dataset.to_table(columns=columns, filter=expr)
+
+
+def stats() -> Dict[str, Any]:
+    conn = _connect()
+    try:
+        cases, = conn.execute("SELECT COUNT(*) FROM exported").fetchone()
+        parts, partitions, rows = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT partition), COALESCE(SUM(rows), 0) FROM parts"
+        ).fetchone()
+    finally:
+        conn.close()
+    size = sum(p.stat().st_size for p in dataset_dir().glob("**/*.parquet")) if dataset_dir().exists() else 0
+    return {
+        "cases": cases,
+        "rows": rows,
+        "partitions": partitions,
+        "parts": parts,
+        "bytes": size,
+        "path": str(dataset_dir()),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    cmd = argv[0] if argv else "stats"
+
+    def opt(name: str) -> Optional[str]:
+        return argv[argv.index(name) + 1] if name in argv else None
+
+    try:
+        if cmd == "export":
+            t0 = time.perf_counter()
+            result = export()
+            result["seconds"] = round(time.perf_counter() - t0, 2)
+            print(json.dumps(result))
+            return 0
+        if cmd == "compact":
+            print(json.dumps(compact()))
+            return 0
+        if cmd == "stats":
+            print(json.dumps(stats()))
+            return 0
+        if cmd == "scan":
+            t0 = time.perf_counter()
+            table = scan(service_id=opt("--service"), since=opt("--since"), band=opt("--band"))
+            print(table.slice(0, 20).to_pylist())
+            print(f"({table.num_rows} rows, {(time.perf_counter() - t0) * 1000:.1f} ms)", file=sys.stderr)
+            return 0
+    except AnalyticsExportError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+
+    print(
+        "usage: python -m app.analytics_export "
+        "[export | compact | stats | scan [--service ID] [--since YYYY-MM-DD] [--band BAND]]"
+    )
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
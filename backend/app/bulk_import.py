@@ -0,0 +1,396 @@
+"""
+Bulk import of free-text intake narratives.
+
+Partner agencies send thousands of narratives at once; this streams a JSONL
+or CSV file of `RawIntake` records (`text`, optional `language` and `id`)
+through the same pipeline as the API:
+
+    parse_case_with_llm -> triage.evaluate_profile -> proof package
+
+- at most `--concurrency` records are in flight at a time; explanation
+  calls wait for an LLM slot rather than falling back to rule templates,
+  so imported cases are never degraded;
+- every finished LLM step is appended to a checkpoint file, so a crashed
+  run resumes without re-paying for parses/evaluations that already
+  completed;
+- results are written to the output JSONL in input order.  A record that
+  fails (e.g. the LLM stayed overloaded) gets no output line; its error is
+  kept in the checkpoint and the next run over the same input retries it
+  first and, once it succeeds, puts its line back in input order (every
+  line carries the record's input `index`);
+- throughput and ETA are reported on stderr.
+
+Usage (from backend/):
+
+    python -m app.bulk_import intakes.jsonl -o results.jsonl --concurrency 8
+    python -m app.bulk_import intakes.csv -o results.jsonl --stub-llm
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+import orjson
+
+from .storage import file_sha256
+
+# 同一时间最多缓冲多少个“已完成但还没轮到写出”的结果（相对 concurrency 的倍数）
+WINDOW_FACTOR = 4
+# 批量导入时 Overloaded 的最大重试次数
+MAX_OVERLOAD_RETRIES = 20
+
+
+# --------------------------------------------------------------------------
+# Input
+# --------------------------------------------------------------------------
+
+
+def iter_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield raw intake dicts from a JSONL or CSV file, one at a time."""
+    if path.suffix.lower() == ".csv":
+        with path.open(newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                yield row
+        return
+
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def count_records(path: Path) -> int:
+    return sum(1 for _ in iter_records(path))
+
+
+# --------------------------------------------------------------------------
+# Checkpoint + ordered output
+# --------------------------------------------------------------------------
+
+
+class Checkpoint:
+    """
+    Append-only JSONL log of finished steps:
+
+        {"input_sha256": ...}                       (header)
+        {"index": 3, "profile": {...}}              parse done
+        {"index": 3, "evaluation": {...}}           evaluation done
+        {"index": 3, "error": "..."}                record failed
+        {"index": 3, "written": true}               retried record written out
+    """
+
+    def __init__(self, path: Path, input_sha256: str):
+        self.path = path
+        self.profiles: Dict[int, Dict[str, Any]] = {}
+        self.evaluations: Dict[int, bytes] = {}
+        self.errors: Dict[int, str] = {}
+        self.written: Set[int] = set()
+
+        if path.exists():
+            with path.open("rb") as f:
+                lines = f.read().splitlines()
+            if not lines:
+                raise SystemExit(f"{path} is empty; use --restart to start over")
+            header = orjson.loads(lines[0])
+            if header.get("input_sha256") != input_sha256:
+                raise SystemExit(
+                    f"{path} belongs to a different input file; use --restart to start over"
+                )
+            for raw in lines[1:]:
+                try:
+                    entry = orjson.loads(raw)
+                except orjson.JSONDecodeError:
+                    continue  # 崩溃时写了一半的最后一行
+                idx = entry["index"]
+                if "profile" in entry:
+                    self.profiles[idx] = entry["profile"]
+                elif "evaluation" in entry:
+                    self.evaluations[idx] = orjson.dumps(entry["evaluation"])
+                elif "error" in entry:
+                    self.errors[idx] = entry["error"]
+                elif entry.get("written"):
+                    self.written.add(idx)
+            self._f = path.open("ab")
+        else:
+            self._f = path.open("wb")
+            self._append({"input_sha256": input_sha256})
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        self._f.write(orjson.dumps(entry) + b"\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def record_profile(self, idx: int, profile: Dict[str, Any]) -> None:
+        self.profiles[idx] = profile
+        self._append({"index": idx, "profile": profile})
+
+    def record_evaluation(self, idx: int, body: bytes) -> None:
+        self.evaluations[idx] = body
+        # body 已经是 JSON，直接拼进去，不再 decode/encode
+        self._f.write(b'{"index":%d,"evaluation":%s}\n' % (idx, body))
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def record_error(self, idx: int, error: str) -> None:
+        self.errors[idx] = error
+        self._append({"index": idx, "error": error})
+
+    def record_written(self, idx: int) -> None:
+        self.written.add(idx)
+        self._append({"index": idx, "written": True})
+
+    def to_retry(self, last_written: int) -> List[int]:
+        """Failed records the ordered output has already passed and that still lack a line."""
+        return sorted(i for i in self.errors if i <= last_written and i not in self.written)
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def _last_output_index(path: Path) -> int:
+    """
+    Input index of the last ordered line in `path` (-1 if none); a torn last
+    line is cut off first.  Retried records appended after it are skipped.
+    """
+    if not path.exists():
+        return -1
+    data = path.read_bytes()
+    complete = data.rfind(b"\n") + 1
+    if complete != len(data):
+        with path.open("r+b") as f:
+            f.truncate(complete)
+    last = -1
+    for line in data[:complete].splitlines():
+        idx = orjson.loads(line)["index"]
+        # 重试补上的行可能还排在后面（上次运行没来得及重排），index 比前面的小
+        last = max(last, idx)
+    return last
+
+
+def _sort_output(path: Path) -> None:
+    """
+    Rewrite `path` in input order when retried lines were appended out of
+    place.  Only (index, offset, length) per line is held in memory; the
+    lines are copied into a temp file that replaces the output atomically.
+    """
+    spans: List[Tuple[int, int, int]] = []
+    with path.open("rb") as f:
+        offset = 0
+        for line in f:
+            spans.append((orjson.loads(line)["index"], offset, len(line)))
+            offset += len(line)
+        if all(a[0] < b[0] for a, b in zip(spans, spans[1:])):
+            return
+        spans.sort()
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with tmp.open("wb") as out:
+            for _, offset, length in spans:
+                f.seek(offset)
+                out.write(f.read(length))
+            out.flush()
+            os.fsync(out.fileno())
+    os.replace(tmp, path)
+
+
+class Progress:
+    def __init__(self, total: int, already_done: int):
+        self.total = total
+        self.done = already_done
+        self._start_done = already_done
+        self._started = time.monotonic()
+        self._last_report = 0.0
+
+    def advance(self) -> None:
+        self.done += 1
+        now = time.monotonic()
+        if now - self._last_report < 1.0 and self.done != self.total:
+            return
+        self._last_report = now
+        elapsed = max(now - self._started, 1e-9)
+        rate = (self.done - self._start_done) / elapsed
+        remaining = self.total - self.done
+        eta = remaining / rate if rate > 0 else float("inf")
+        print(
+            f"\r{self.done}/{self.total} records  {rate:6.1f} rec/s  ETA {eta:7.1f}s",
+            end="",
+            file=sys.stderr,
+            flush=True,
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started
+        processed = self.done - self._start_done
+        return {
+            "processed": processed,
+            "total": self.total,
+            "elapsed_seconds": round(elapsed, 2),
+            "records_per_second": round(processed / elapsed, 2) if elapsed else None,
+        }
+
+
+# --------------------------------------------------------------------------
+# Pipeline
+# --------------------------------------------------------------------------
+
+
+async def _parse_with_retry(raw: Any) -> Any:
+    from .admission import Overloaded
+    from .llm_client import parse_case_with_llm
+
+    for attempt in range(MAX_OVERLOAD_RETRIES):
+        try:
+            return await parse_case_with_llm(raw)
+        except Overloaded as exc:
+            # 批量任务不丢记录：按 Retry-After 退避后重试
+            await asyncio.sleep(exc.retry_after * (1 + attempt / 4))
+    raise RuntimeError("LLM stayed overloaded; giving up on this record")
+
+
+def _evaluate(profile: Any) -> bytes:
+    from .admission import admission
+    from .triage import evaluate_profile
+
+    # 批量任务自己控制并发，不走 degraded 模式；解释等 slot 而不是退回模板
+    with admission.wait_for_slots():
+        return evaluate_profile(profile, False)
+
+
+async def _process(
+    idx: int,
+    record: Dict[str, Any],
+    ckpt: Checkpoint,
+    sem: asyncio.Semaphore,
+) -> Tuple[int, Dict[str, Any], Optional[bytes], Optional[str]]:
+    from .models import CaseProfile, RawIntake
+
+    if idx in ckpt.evaluations:
+        return idx, record, ckpt.evaluations[idx], None
+    # 之前失败的记录（超时、LLM 一直 overloaded…）每次运行都重新试
+
+    async with sem:
+        try:
+            if idx in ckpt.profiles:
+                profile = CaseProfile(**ckpt.profiles[idx])
+            else:
+                raw = RawIntake(text=record["text"], language=record.get("language") or "en")
+                profile = await _parse_with_retry(raw)
+                ckpt.record_profile(idx, profile.dict())
+
+            body = await asyncio.to_thread(_evaluate, profile)
+            ckpt.record_evaluation(idx, body)
+            return idx, record, body, None
+        except Exception as exc:  # 单条失败不影响整批
+            error = f"{type(exc).__name__}: {exc}"
+            ckpt.record_error(idx, error)
+            return idx, record, None, error
+
+
+def _output_line(idx: int, record: Dict[str, Any], body: bytes) -> bytes:
+    head = orjson.dumps({"index": idx, "id": record.get("id")})[:-1]
+    return head + b',"evaluation":' + body + b"}\n"
+
+
+async def run(
+    input_path: Path,
+    output_path: Path,
+    concurrency: int = 8,
+    checkpoint_path: Optional[Path] = None,
+    restart: bool = False,
+) -> Dict[str, Any]:
+    checkpoint_path = checkpoint_path or output_path.with_name(output_path.name + ".ckpt")
+    if restart:
+        checkpoint_path.unlink(missing_ok=True)
+        output_path.unlink(missing_ok=True)
+
+    ckpt = Checkpoint(checkpoint_path, file_sha256(input_path))
+    last_written = _last_output_index(output_path)
+    retry = ckpt.to_retry(last_written)
+    progress = Progress(count_records(input_path), last_written + 1 - len(retry))
+
+    sem = asyncio.Semaphore(concurrency)
+    window: Deque[asyncio.Task] = deque()
+    errors = 0
+
+    with output_path.open("ab") as out:
+
+        async def write_head(retried: bool = False) -> None:
+            nonlocal errors
+            idx, record, body, error = await window.popleft()
+            if error is None:
+                out.write(_output_line(idx, record, body))
+                out.flush()
+                if retried:
+                    # 重试的行不在顺序位置上，记下来免得下次再补一遍
+                    ckpt.record_written(idx)
+            else:
+                errors += 1
+            progress.advance()
+
+        # 先重试之前失败、已经被顺序输出越过的记录
+        if retry:
+            pending = set(retry)
+            for idx, record in enumerate(iter_records(input_path)):
+                if idx in pending:
+                    window.append(asyncio.create_task(_process(idx, record, ckpt, sem)))
+                    while len(window) >= concurrency * WINDOW_FACTOR:
+                        await write_head(retried=True)
+                if idx >= retry[-1]:
+                    break
+            while window:
+                await write_head(retried=True)
+
+        for idx, record in enumerate(iter_records(input_path)):
+            if idx <= last_written:
+                continue
+            window.append(asyncio.create_task(_process(idx, record, ckpt, sem)))
+            # 保证按输入顺序写出，同时限制缓冲的结果数量
+            while len(window) >= concurrency * WINDOW_FACTOR:
+                await write_head()
+        while window:
+            await write_head()
+
+    # 重试补上的行按输入顺序插回去（上次运行在重排之前被杀掉的也一样）
+    _sort_output(output_path)
+    ckpt.close()
+    print(file=sys.stderr)
+    summary = progress.summary()
+    summary["errors"] = errors
+    if errors:
+        summary["note"] = f"{errors} record(s) failed (see {checkpoint_path}); re-run to retry them"
+    summary["output"] = str(output_path)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.bulk_import", description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", type=Path, help="JSONL or CSV file of RawIntake records")
+    parser.add_argument("-o", "--output", type=Path, required=True, help="results JSONL (appended in input order)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--checkpoint", type=Path, default=None, help="default: <output>.ckpt")
+    parser.add_argument("--restart", action="store_true", help="ignore existing checkpoint/output")
+    parser.add_argument("--stub-llm", action="store_true", help="use the local deterministic LLM stub")
+    args = parser.parse_args(argv)
+
+    if args.stub_llm:
+        # 必须在 import llm_client 之前设置
+        os.environ["FAIRROUTE_LLM_STUB"] = "1"
+
+    summary = asyncio.run(
+        run(args.input, args.output, args.concurrency, args.checkpoint, args.restart)
+    )
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
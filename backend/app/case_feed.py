@@ -0,0 +1,310 @@
+"""
+Push feed of newly evaluated cases for the staff console.
+
+Before this, a live queue view had to poll `GET /api/staff/case/{case_id}`.
+Now staff clients subscribe to `/api/staff/feed` (WebSocket) and
+`evaluate_profile()` publishes each new case:
+
+- every process that evaluates cases (each gunicorn/uvicorn worker, the
+  bulk importer) appends the JSON-encoded event as one line to a shared
+  log, logs/case_feed.jsonl.  Each worker with connected staff clients
+  tails that log, so a client sees every case whichever process created
+  it;
+- publishing never blocks on subscribers: it is one appended line;
+- each worker reads and parses a new line once, however many of its
+  clients are connected, and stops tailing when the last one leaves;
+- each subscriber has a bounded buffer (`feed_buffer_size`).  A slow client
+  that falls behind loses its oldest events and is sent a `feed.lagged`
+  notice with the number dropped, so it can re-sync; other clients and the
+  evaluate path are unaffected;
+- subscriptions can be filtered by priority band and/or service id.
+
+The log is polled every `feed_poll_seconds` and, once it grows past
+`feed_log_max_bytes`, rotated to numbered generations case_feed.jsonl.1,
+.2, ... (the newest `ROTATED_LOGS` are kept).  A tailer that finds its file
+rotated away finishes reading it, then reads every newer generation before
+moving on to the live log, so several rotations between two polls lose
+nothing.  Subscribers only receive events published after they connected.
+
+Events carry a `type`; evaluate emits `case.created`.  Anything that later
+changes a case's priority can emit `case.priority_changed` through the same
+`publish()`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import glob
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+import orjson
+
+from .config import LOG_DIR, settings
+from .storage import file_lock
+
+FEED_LOG_PATH = LOG_DIR / "case_feed.jsonl"
+# 保留多少代轮转出去的日志；落后更多代的 tailer 会丢掉最老的几代
+ROTATED_LOGS = 5
+
+
+class FeedEvent:
+    __slots__ = ("band", "service_ids", "text")
+
+    def __init__(self, band: str, service_ids: FrozenSet[str], text: str):
+        self.band = band
+        self.service_ids = service_ids
+        # 编码一次，所有订阅者共用同一个 str
+        self.text = text
+
+
+class Subscription:
+    """One connected staff client: filters + bounded buffer."""
+
+    def __init__(
+        self,
+        bands: Optional[Set[str]] = None,
+        services: Optional[Set[str]] = None,
+        maxsize: int = 256,
+    ):
+        self.bands = bands or None
+        self.services = services or None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._reported_dropped = 0
+
+    def wants(self, event: FeedEvent) -> bool:
+        if self.bands is not None and event.band not in self.bands:
+            return False
+        if self.services is not None and not (self.services & event.service_ids):
+            return False
+        return True
+
+    def offer(self, event: FeedEvent) -> bool:
+        """Enqueue without waiting; a full buffer drops its oldest event (returns True)."""
+        dropped = self.queue.full()
+        if dropped:
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+        return dropped
+
+    async def next_text(self) -> str:
+        """Next frame to send: a `feed.lagged` notice first if events were dropped."""
+        if self.dropped != self._reported_dropped:
+            lost = self.dropped - self._reported_dropped
+            self._reported_dropped = self.dropped
+            return orjson.dumps({"type": "feed.lagged", "dropped": lost}).decode()
+        event = await self.queue.get()
+        return event.text
+
+
+def _event_from_line(line: bytes) -> Optional[FeedEvent]:
+    try:
+        message = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return None
+    return FeedEvent(
+        band=message.get("band") or "unknown",
+        service_ids=frozenset(s.get("service_id") for s in message.get("services") or []),
+        text=line.decode("utf-8"),
+    )
+
+
+class CaseFeed:
+    """Appends events to the shared log and fans them out to this worker's subscribers."""
+
+    def __init__(
+        self,
+        buffer_size: int,
+        log_path: Path = FEED_LOG_PATH,
+        poll_seconds: float = 0.25,
+        max_log_bytes: int = 16 * 1024 * 1024,
+    ):
+        self.buffer_size = buffer_size
+        self.log_path = Path(log_path)
+        self.poll_seconds = poll_seconds
+        self.max_log_bytes = max_log_bytes
+        self._subscribers: List[Subscription] = []
+        self._tailer: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_settings(cls) -> "CaseFeed":
+        return cls(
+            buffer_size=settings.feed_buffer_size,
+            poll_seconds=settings.feed_poll_seconds,
+            max_log_bytes=settings.feed_log_max_bytes,
+        )
+
+    # ---- subscriber side (event loop) ----
+
+    def subscribe(
+        self, bands: Optional[Set[str]] = None, services: Optional[Set[str]] = None
+    ) -> Subscription:
+        sub = Subscription(bands, services, self.buffer_size)
+        self._subscribers.append(sub)
+        loop = asyncio.get_running_loop()
+        if self._tailer is None or self._tailer.done() or self._tailer.get_loop() is not loop:
+            # 第一个订阅者来了才开始跟读日志，从当前末尾开始
+            self._tailer = loop.create_task(self._tail())
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        try:
+            self._subscribers.remove(sub)
+        except ValueError:
+            pass
+
+    def _fan_out(self, event: FeedEvent) -> None:
+        for sub in self._subscribers:
+            if sub.wants(event):
+                self.dropped += sub.offer(event)
+                self.delivered += 1
+
+    def _open_log(self):
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        return open(self.log_path, "ab+")
+
+    def _rotated_logs(self) -> List[Tuple[int, Path]]:
+        """Rotated generations as (number, path), oldest first."""
+        prefix = self.log_path.name + "."
+        found = []
+        for path in self.log_path.parent.glob(glob.escape(prefix) + "*"):
+            suffix = path.name[len(prefix):]
+            if suffix.isdigit():
+                found.append((int(suffix), path))
+        return sorted(found)
+
+    def _follow_rotation(self, current) -> List[Any]:
+        """
+        Files to read after `current` was rotated away: every newer rotated
+        generation, then the live log from the start.
+        """
+        ino = os.fstat(current.fileno()).st_ino
+        # 共享锁：打开这些文件的时候不会再有轮转
+        with file_lock(self.log_path, exclusive=False):
+            rotated = self._rotated_logs()
+            newer = [path for _, path in rotated]
+            for i, (_, path) in enumerate(rotated):
+                if os.stat(path).st_ino == ino:
+                    newer = newer[i + 1:]
+                    break
+            # 自己那一代已经被删掉了：剩下的都比它新
+            files = [open(path, "rb") for path in newer]
+            live = self._open_log()
+        live.seek(0)
+        return files + [live]
+
+    async def _tail(self) -> None:
+        # 第一个是正在读的文件，最后一个是当前的日志
+        files = [self._open_log()]
+        files[0].seek(0, os.SEEK_END)
+        partial = b""
+        try:
+            while self._subscribers:
+                f = files[0]
+                chunk = f.read()
+                if chunk:
+                    lines = (partial + chunk).split(b"\n")
+                    partial = lines.pop()
+                    for line in lines:
+                        event = _event_from_line(line) if line else None
+                        if event is not None:
+                            self._fan_out(event)
+                    # 日志一直有新内容时也让出 event loop
+                    await asyncio.sleep(0)
+                    continue
+                if len(files) > 1:
+                    # 轮转出去的文件不会再有人写，读完了就换下一个
+                    files.pop(0).close()
+                    partial = b""
+                    continue
+                try:
+                    rotated = os.stat(self.log_path).st_ino != os.fstat(f.fileno()).st_ino
+                except FileNotFoundError:
+                    rotated = True
+                if rotated:
+                    # 上面那次 read 之后、轮转之前可能还有人写过：先把 f 读完再往后走
+                    files = [f] + self._follow_rotation(f)
+                    continue
+                await asyncio.sleep(self.poll_seconds)
+        finally:
+            for f in files:
+                f.close()
+
+    # ---- publisher side (any thread, any process) ----
+
+    def publish(self, event_type: str, summary: Dict[str, Any]) -> None:
+        """Append one event to the shared log; never waits for subscribers."""
+        line = orjson.dumps({"type": event_type, **summary}) + b"\n"
+        # 写事件拿共享锁，轮转拿排它锁：轮转之后不会再有进程往旧文件里写
+        with file_lock(self.log_path, exclusive=False):
+            # O_APPEND：多个进程同时写，每行都整行追加在末尾
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+        with self._lock:
+            self.published += 1
+        if size > self.max_log_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        with file_lock(self.log_path, exclusive=True):
+            try:
+                if os.stat(self.log_path).st_size <= self.max_log_bytes:
+                    return  # 别的进程已经轮转过了
+            except FileNotFoundError:
+                return
+            # 每次轮转都用新的编号，不覆盖还没被 tailer 读完的上一代
+            rotated = self._rotated_logs()
+            number = rotated[-1][0] + 1 if rotated else 1
+            os.replace(self.log_path, self.log_path.with_name(f"{self.log_path.name}.{number}"))
+            for _, old in rotated[: max(0, len(rotated) + 1 - ROTATED_LOGS)]:
+                old.unlink(missing_ok=True)
+
+    def publish_case(self, package: Dict[str, Any]) -> None:
+        """Publish a `case.created` summary of a freshly written proof package."""
+        self.publish("case.created", case_summary(package))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "buffer_size": self.buffer_size,
+            "log_path": str(self.log_path),
+        }
+
+
+def case_summary(package: Dict[str, Any]) -> Dict[str, Any]:
+    """What the staff queue view needs; the full package stays behind /staff/case/{id}."""
+    profile = package.get("case_profile") or {}
+    priority = package.get("ticket_priority") or {}
+    return {
+        "case_id": package.get("case_id"),
+        "created_at": package.get("created_at"),
+        "band": priority.get("band"),
+        "score": priority.get("score"),
+        "requires_human_review": priority.get("requires_human_review", False),
+        "reasons": priority.get("reasons", []),
+        "preferred_language": profile.get("preferred_language"),
+        "province": profile.get("province"),
+        "degraded_mode": package.get("degraded_mode", False),
+        "services": [
+            {"service_id": r.get("service_id"), "eligibility_status": r.get("eligibility_status")}
+            for r in package.get("recommendations") or []
+        ],
+    }
+
+
+case_feed = CaseFeed.from_settings()
@@ -1,6 +1,8 @@
 # backend/app/config.py
 
 import os
+from pathlib import Path
+
 from dotenv import load_dotenv
 from pydantic import BaseModel
 
@@ -9,9 +11,70 @@ BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # .../backend/app -> .../
 ENV_PATH = os.path.join(BASE_DIR, ".env")
 load_dotenv(ENV_PATH)
 
+# proof package、rollups、case feed 等运行时文件都放在 backend/logs/
+LOG_DIR = Path(BASE_DIR) / "logs"
+
 class Settings(BaseModel):
     openai_api_key: str | None = os.getenv("OPENAI_API_KEY")
     openai_model_name: str = os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini")
 
+    # 预编译的只读 reference snapshot（python -m app.snapshot build 生成）
+    snapshot_path: str = os.getenv(
+        "FAIRROUTE_SNAPSHOT_PATH", os.path.join(BASE_DIR, "snapshots", "reference.snap")
+    )
+    # worker 每隔多少秒检查一次 snapshot 是否被替换
+    snapshot_recheck_seconds: float = float(os.getenv("FAIRROUTE_SNAPSHOT_RECHECK_SECONDS", "5"))
+
+    # LLM admission control（见 app/admission.py）
+    llm_max_in_flight: int = int(os.getenv("FAIRROUTE_LLM_MAX_IN_FLIGHT", "8"))
+    llm_max_queue: int = int(os.getenv("FAIRROUTE_LLM_MAX_QUEUE", "16"))
+    llm_queue_timeout_seconds: float = float(os.getenv("FAIRROUTE_LLM_QUEUE_TIMEOUT_SECONDS", "5"))
+    # 最近 LLM 平均延迟超过这个值 → parse 限流，evaluate 进入 rules-only 模式
+    llm_degrade_latency_seconds: float = float(os.getenv("FAIRROUTE_LLM_DEGRADE_LATENCY_SECONDS", "8"))
+    # 超过这个时间没有新的延迟样本，就不再相信旧的平均值
+    llm_latency_window_seconds: float = float(os.getenv("FAIRROUTE_LLM_LATENCY_WINDOW_SECONDS", "30"))
+    llm_retry_after_seconds: int = int(os.getenv("FAIRROUTE_LLM_RETRY_AFTER_SECONDS", "5"))
+
+    # proof package 归档（见 app/proof_archive.py）
+    archive_after_days: float = float(os.getenv("FAIRROUTE_ARCHIVE_AFTER_DAYS", "7"))
+    proof_retention_days: float = float(os.getenv("FAIRROUTE_PROOF_RETENTION_DAYS", "2555"))
+
+    # services / programs 源文件 ingest 后的二进制 cache（见 app/reference_data.py）
+    reference_cache_dir: str = os.getenv(
+        "FAIRROUTE_REFERENCE_CACHE_DIR", os.path.join(BASE_DIR, "cache", "reference")
+    )
+
+    # staff dashboard rollups（见 app/rollups.py）
+    rollup_flush_seconds: float = float(os.getenv("FAIRROUTE_ROLLUP_FLUSH_SECONDS", "2"))
+    rollup_hourly_retention_hours: int = int(os.getenv("FAIRROUTE_ROLLUP_HOURLY_RETENTION_HOURS", "168"))
+    rollup_daily_retention_days: int = int(os.getenv("FAIRROUTE_ROLLUP_DAILY_RETENTION_DAYS", "400"))
+
+    # staff case feed 每个订阅者最多缓冲多少条事件（见 app/case_feed.py）
+    feed_buffer_size: int = int(os.getenv("FAIRROUTE_FEED_BUFFER_SIZE", "256"))
+    # 各进程共享的事件日志多久读一次、多大时轮转
+    feed_poll_seconds: float = float(os.getenv("FAIRROUTE_FEED_POLL_SECONDS", "0.25"))
+    feed_log_max_bytes: int = int(os.getenv("FAIRROUTE_FEED_LOG_MAX_BYTES", str(16 * 1024 * 1024)))
+
+    # proof package 的 Parquet 分析数据集（见 app/analytics_export.py）
+    analytics_dir: str = os.getenv("FAIRROUTE_ANALYTICS_DIR", os.path.join(BASE_DIR, "analytics"))
+
+    # LLM model routing / prompt budget（见 app/model_router.py）
+    llm_fast_model: str = os.getenv("FAIRROUTE_LLM_FAST_MODEL") or os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini")
+    llm_strong_model: str = os.getenv("FAIRROUTE_LLM_STRONG_MODEL", "gpt-4o")
+    # 估算 token 数超过这个值（或中英混杂）的 intake 才交给 strong 模型解析
+    llm_parse_fast_max_tokens: int = int(os.getenv("FAIRROUTE_LLM_PARSE_FAST_MAX_TOKENS", "600"))
+    llm_parse_max_input_tokens: int = int(os.getenv("FAIRROUTE_LLM_PARSE_MAX_INPUT_TOKENS", "3000"))
+    llm_parse_max_output_tokens: int = int(os.getenv("FAIRROUTE_LLM_PARSE_MAX_OUTPUT_TOKENS", "400"))
+    llm_explain_max_input_tokens: int = int(os.getenv("FAIRROUTE_LLM_EXPLAIN_MAX_INPUT_TOKENS", "600"))
+    llm_explain_max_output_tokens: int = int(os.getenv("FAIRROUTE_LLM_EXPLAIN_MAX_OUTPUT_TOKENS", "200"))
+
+    # parse 之后提前算 evaluate（见 app/speculative.py）
+    speculative_eval_enabled: bool = os.getenv("FAIRROUTE_SPECULATIVE_EVAL", "1").lower() in ("1", "true", "yes")
+    speculative_workers: int = int(os.getenv("FAIRROUTE_SPECULATIVE_WORKERS", "4"))
+    speculative_max_entries: int = int(os.getenv("FAIRROUTE_SPECULATIVE_MAX_ENTRIES", "256"))
+    speculative_ttl_seconds: float = float(os.getenv("FAIRROUTE_SPECULATIVE_TTL_SECONDS", "120"))
+    # evaluate 最多等还在跑的推测结果多久，超时就自己算
+    speculative_join_timeout_seconds: float = float(os.getenv("FAIRROUTE_SPECULATIVE_JOIN_TIMEOUT_SECONDS", "5"))
+
 settings = Settings()
 
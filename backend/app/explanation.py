@@ -1,7 +1,6 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
 from .models import Service
-from .llm_client import generate_explanation_with_llm
 
 
 def build_staff_explanation(
@@ -36,7 +35,13 @@ def build_client_explanation(
     fired_rules: List[Dict[str, Any]],
     guide: Dict[str, Any],
     preferred_language: str,
-) -> str:
+    use_llm: bool = True,
+) -> Tuple[str, str]:
+    """
+    Returns (text, source): source is "llm" when the LLM rewrote the rule
+    template and "template" when the raw template is returned, either
+    because use_llm is False or because no LLM slot was free.
+    """
     if fired_rules:
         base_text = fired_rules[0].get(
             f"explanation_template_{preferred_language}",
@@ -45,6 +50,10 @@ def build_client_explanation(
     else:
         base_text = "We are not certain about your eligibility based on the information provided."
 
+    # degraded (rules-only) 模式：LLM 忙不过来时直接返回规则模板
+    if not use_llm:
+        return base_text.strip(), "template"
+
     extra_context = guide.get("eligibility_text_en", "") if guide else ""
 
     payload = {
@@ -53,7 +62,13 @@ def build_client_explanation(
         "target_language": preferred_language,
     }
 
-    # 这里同步调用，为简单起见
-    # 你也可以把整个 pipeline 调成 async
-    import asyncio
-    return asyncio.run(generate_explanation_with_llm(payload))
+    # 用到时才 import：llm_client 在 import 时就要 OPENAI_API_KEY，
+    # 而 snapshot build 之类的离线工具也会经由 rules_engine import 这里
+    from .llm_client import generate_explanation_with_llm
+
+    # generate_explanation_with_llm 是同步的；evaluate 在线程池里跑，不会阻塞 event loop
+    text = generate_explanation_with_llm(payload)
+    if text is None:
+        # 没有空闲 slot：退回规则模板，由调用方记成 degraded
+        return base_text.strip(), "template"
+    return text, "llm"
@@ -1,25 +1,36 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional
+import asyncio
 import json
 import os
 
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from .admission import admission
+from .model_router import model_router
 from .models import CaseProfile, RawIntake
 
 # Load .env so that OPENAI_API_KEY / OPENAI_MODEL_NAME go into os.environ
 # This runs as soon as the module is imported by FastAPI.
 load_dotenv()
 
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENAI_API_KEY environment variable is not set")
+# FAIRROUTE_LLM_STUB=1 → use the local deterministic stub (tests, bulk dry runs)
+USE_LLM_STUB = os.getenv("FAIRROUTE_LLM_STUB", "").lower() in ("1", "true", "yes")
 
-# Create a single OpenAI client.
-client = OpenAI(api_key=api_key)
+if USE_LLM_STUB:
+    from .llm_stub import StubOpenAIClient
 
-# Read model name from env, default to gpt-4o-mini if not set
-OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini")
+    client = StubOpenAIClient()
+else:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY environment variable is not set")
+
+    # Create a single OpenAI client.
+    client = OpenAI(api_key=api_key)
+
+# Model names per tier come from settings (FAIRROUTE_LLM_FAST_MODEL / _STRONG_MODEL,
+# fast defaults to OPENAI_MODEL_NAME); see app/model_router.py.
 
 async def parse_case_with_llm(intake: RawIntake) -> CaseProfile:
     """
@@ -53,17 +64,27 @@ If it is unclear, set is_single_parent=null.
 Only output JSON, no extra text.
 """
 
+    # 短的普通 intake 走 fast 模型；很长或中英混杂的才用 strong 模型，超长的先截断
+    route, text = model_router.route_parse(intake.text)
+
     messages = [
         {"role": "system", "content": system_prompt},
-        {"role": "user", "content": intake.text},
+        {"role": "user", "content": text},
     ]
 
-    resp = client.chat.completions.create(
-        model=OPENAI_MODEL_NAME,
-        messages=messages,
-        temperature=0,
-        response_format={"type": "json_object"},
-    )
+    # 排队等 LLM slot；排不上会抛 Overloaded，由 router 转成 503 + Retry-After。
+    # 同步的 OpenAI client 放到线程里跑，避免阻塞 event loop。
+    async with admission.slot():
+        with model_router.measure(route) as call:
+            resp = await asyncio.to_thread(
+                client.chat.completions.create,
+                model=route["model"],
+                messages=messages,
+                temperature=0,
+                max_tokens=route["max_tokens"],
+                response_format={"type": "json_object"},
+            )
+            call["usage"] = getattr(resp, "usage", None)
 
     content = resp.choices[0].message.content
     data: Dict[str, Any] = json.loads(content)
@@ -71,14 +92,18 @@ Only output JSON, no extra text.
     return CaseProfile(**data)
 
 
-def generate_explanation_with_llm(payload: Dict[str, Any]) -> str:
+def generate_explanation_with_llm(payload: Dict[str, Any]) -> Optional[str]:
     """
     Use the LLM to turn rule templates + guidance into a plain-language explanation.
     同步版本：注意这里已经不是 async 了。
+
+    Returns None when no LLM slot is free; the caller falls back to the rule
+    template and must report that the explanation was not rewritten.
     """
     base_text = payload.get("base_text", "")
-    extra_context = payload.get("extra_context", "")
     target_language = payload.get("target_language", "en")
+    # 解释改写永远走 fast 模型；guidance 截到预算内，输出 max_tokens 封顶
+    route, extra_context = model_router.route_explain(payload.get("extra_context", ""))
 
     system_prompt = f"""
 You are an assistant that explains Canadian benefit programs in clear {target_language.upper()}.
@@ -102,14 +127,21 @@ Your task:
         ensure_ascii=False,
     )
 
-    resp = client.chat.completions.create(
-        model=OPENAI_MODEL_NAME,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content},
-        ],
-        temperature=0.3,
-    )
+    # 每次调用都要拿到空闲 slot；拿不到就交给调用方用规则模板，不超过 max_in_flight
+    with admission.try_slot() as admitted:
+        if not admitted:
+            return None
+        with model_router.measure(route) as call:
+            resp = client.chat.completions.create(
+                model=route["model"],
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_content},
+                ],
+                temperature=0.3,
+                max_tokens=route["max_tokens"],
+            )
+            call["usage"] = getattr(resp, "usage", None)
 
     return resp.choices[0].message.content.strip()
 
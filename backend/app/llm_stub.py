@@ -0,0 +1,153 @@
+"""
+Local stand-in for the OpenAI client, for tests, demos and bulk dry runs.
+
+Enabled with FAIRROUTE_LLM_STUB=1.  It exposes the one method llm_client
+uses (`client.chat.completions.create`) and answers deterministically:
+
+- JSON-mode requests (intake parsing) get a CaseProfile built from simple
+  keyword rules over the narrative (EN / FR / ZH);
+- other requests (explanations) echo the rule template back.
+
+FAIRROUTE_LLM_STUB_LATENCY (seconds) adds an artificial delay per call.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+_PROVINCES = {
+    "ON": ["ontario", "安省", "安大略"],
+    "QC": ["quebec", "québec", "魁北克"],
+    "BC": ["british columbia", "卑诗"],
+    "AB": ["alberta", "阿尔伯塔"],
+    "MB": ["manitoba"],
+    "SK": ["saskatchewan"],
+    "NS": ["nova scotia", "nouvelle-écosse"],
+    "NB": ["new brunswick", "nouveau-brunswick"],
+    "NL": ["newfoundland", "terre-neuve"],
+    "PE": ["prince edward island", "île-du-prince-édouard"],
+}
+
+_NUMBERS = {
+    "one": 1, "two": 2, "three": 3, "four": 4,
+    "un": 1, "une": 1, "deux": 2, "trois": 3, "quatre": 4,
+    "一": 1, "两": 2, "二": 2, "三": 3, "四": 4,
+}
+
+
+def _language(text: str) -> str:
+    if re.search(r"[一-鿿]", text):
+        return "zh"
+    lowered = f" {text.lower()} "
+    if any(w in lowered for w in (" je ", " j'", " mon ", " mes ", " enfant", " emploi")):
+        return "fr"
+    return "en"
+
+
+def _children(text: str) -> int:
+    lowered = text.lower()
+    m = re.search(r"(\d+|\w+)\s*(?:个)?\s*(?:kids|children|child|enfants?|小孩|孩子)", lowered)
+    if m:
+        word = m.group(1).rstrip("个")
+        if word.isdigit():
+            return int(word)
+        if word in _NUMBERS:
+            return _NUMBERS[word]
+        # 中文没有空格，\w+ 会把前面的字一起吃进来（“我有两”）
+        if word[-1:] in _NUMBERS:
+            return _NUMBERS[word[-1]]
+        return 1
+    if any(w in lowered for w in ("my son", "my daughter", "mon fils", "ma fille", "孩子")):
+        return 1
+    return 0
+
+
+def parse_profile(text: str) -> Dict[str, Any]:
+    """Keyword-based CaseProfile extraction, mirroring the LLM prompt's schema."""
+    lowered = text.lower()
+
+    unemployed = any(
+        w in lowered
+        for w in ("laid off", "lost my job", "unemployed", "contract ended", "perdu mon emploi",
+                  "mis à pied", "s'est terminé", "失业", "裁员", "被辞退")
+    )
+    reason = None
+    if unemployed:
+        if any(w in lowered for w in ("laid off", "mis à pied", "裁员")):
+            reason = "layoff"
+        elif any(w in lowered for w in ("contract", "contrat", "合同")):
+            reason = "end_of_contract"
+        else:
+            reason = "unknown"
+
+    province = None
+    for code, names in _PROVINCES.items():
+        if any(n in lowered for n in names):
+            province = code
+            break
+
+    hours = re.search(r"(\d{2,4})\s*(?:insurable\s*)?(?:hours|heures|小时)", lowered)
+    age = re.search(r"(\d{2})\s*(?:years old|-year-old man|-year-old woman|ans|岁)", lowered)
+    children = _children(text)
+
+    single_parent = None
+    if any(w in lowered for w in ("single mom", "single dad", "single parent", "parent seul",
+                                  "mère seule", "père seul", "单亲")):
+        single_parent = True
+    elif any(w in lowered for w in ("my husband", "my wife", "my partner", "mon conjoint",
+                                    "ma conjointe", "我丈夫", "我妻子")):
+        single_parent = False
+
+    return {
+        "age": int(age.group(1)) if age else None,
+        "province": province,
+        "employment_status": "unemployed" if unemployed else None,
+        "unemployment_reason": reason,
+        "children_count": children,
+        "youngest_child_age": None,
+        "is_single_parent": single_parent if children else None,
+        "has_disability": any(w in lowered for w in ("disability", "handicap", "残疾")),
+        "needs_accommodation": any(w in lowered for w in ("accommodation", "hearing", "adaptation", "无障碍")),
+        "preferred_language": _language(text),
+        "insurable_hours_last_52_weeks": int(hours.group(1)) if hours else None,
+        "residency_status": "canadian_resident" if province else "unknown",
+    }
+
+
+class _Completions:
+    def create(self, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> SimpleNamespace:
+        delay = float(os.getenv("FAIRROUTE_LLM_STUB_LATENCY", "0") or 0)
+        if delay:
+            time.sleep(delay)
+
+        user_content = messages[-1]["content"]
+        if (kwargs.get("response_format") or {}).get("type") == "json_object":
+            content = json.dumps(parse_profile(user_content), ensure_ascii=False)
+        else:
+            try:
+                payload = json.loads(user_content)
+            except ValueError:
+                payload = {"base_text": user_content}
+            content = (payload.get("base_text") or "").strip()
+
+        usage = SimpleNamespace(
+            prompt_tokens=sum(len(m["content"]) for m in messages) // 4,
+            completion_tokens=len(content) // 4,
+        )
+        return SimpleNamespace(
+            model=f"stub:{model}",
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
+
+
+class StubOpenAIClient:
+    """Drop-in for `openai.OpenAI` as far as llm_client is concerned."""
+
+    def __init__(self) -> None:
+        self.chat = SimpleNamespace(completions=_Completions())
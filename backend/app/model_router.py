@@ -0,0 +1,220 @@
+"""
+Model routing and prompt budgeting for LLM calls.
+
+Every call used to go to one OPENAI_MODEL_NAME with whatever input it got.
+The router picks a model tier per task and input instead:
+
+- explain (rewrite a rule template): always the fast tier, guidance context
+  trimmed to `llm_explain_max_input_tokens`, `max_tokens` capped at
+  `llm_explain_max_output_tokens` (the prompt asks for at most 4 sentences);
+- parse (narrative -> CaseProfile JSON): the fast tier for ordinary
+  intakes; the strong tier only when the narrative is long (more than
+  `llm_parse_fast_max_tokens`) or mixes scripts (e.g. Chinese + English),
+  which is where the small model's extractions go wrong.  Narratives over
+  `llm_parse_max_input_tokens` are trimmed to their beginning and end.
+
+Token counts are estimated without a tokenizer (about 4 characters per
+token for alphabetic text, one token per CJK character), which is close
+enough for budgeting.  Latency and token usage are recorded per task and
+tier and exposed at /api/admin/llm.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Tuple
+
+from .config import settings
+
+FAST = "fast"
+STRONG = "strong"
+
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+_LATIN = re.compile(r"[A-Za-zÀ-ÿ]")
+# 截断时在中间插入的标记
+TRIM_MARKER = "\n[...]\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 chars/token, CJK characters count one each."""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def is_mixed_script(text: str) -> bool:
+    """True when the text has a substantial share of both CJK and Latin letters."""
+    cjk = len(_CJK.findall(text))
+    latin = len(_LATIN.findall(text))
+    letters = cjk + latin
+    if letters < 20:
+        return False
+    # 英文按字母数、中文按字数比较会偏向英文；中文字数乘 3 大致折算成同等信息量
+    share = 3 * cjk / (3 * cjk + latin)
+    return 0.15 <= share <= 0.85
+
+
+def trim_to_budget(text: str, max_tokens: int) -> Tuple[str, bool]:
+    """
+    Cut `text` down to about `max_tokens`, keeping the first two thirds of
+    the budget from the start and the rest from the end (intakes tend to
+    open with who the person is and close with what just happened).
+    """
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text, False
+    keep = max(int(len(text) * max_tokens / tokens) - len(TRIM_MARKER), 0)
+    head = keep * 2 // 3
+    tail = keep - head
+    return text[:head].rstrip() + TRIM_MARKER + (text[-tail:].lstrip() if tail else ""), True
+
+
+class _TierStats:
+    # 最近多少次调用用来算 p95
+    WINDOW = 200
+
+    def __init__(self, model: str):
+        self.model = model
+        self.calls = 0
+        self.errors = 0
+        self.trimmed = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_total = 0.0
+        self.latencies: Deque[float] = deque(maxlen=self.WINDOW)
+
+    def as_dict(self) -> Dict[str, Any]:
+        recent = sorted(self.latencies)
+        ok = self.calls - self.errors
+        return {
+            "model": self.model,
+            "calls": self.calls,
+            "errors": self.errors,
+            "trimmed_inputs": self.trimmed,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_latency_seconds": round(self.latency_total / ok, 3) if ok else None,
+            "p95_latency_seconds": (
+                round(recent[min(int(len(recent) * 0.95), len(recent) - 1)], 3) if recent else None
+            ),
+        }
+
+
+class ModelRouter:
+    """Chooses model + limits per LLM call and keeps per-tier metrics."""
+
+    def __init__(
+        self,
+        fast_model: str,
+        strong_model: str,
+        parse_fast_max_tokens: int,
+        parse_max_input_tokens: int,
+        parse_max_output_tokens: int,
+        explain_max_input_tokens: int,
+        explain_max_output_tokens: int,
+    ):
+        self.models = {FAST: fast_model, STRONG: strong_model}
+        self.parse_fast_max_tokens = parse_fast_max_tokens
+        self.parse_max_input_tokens = parse_max_input_tokens
+        self.parse_max_output_tokens = parse_max_output_tokens
+        self.explain_max_input_tokens = explain_max_input_tokens
+        self.explain_max_output_tokens = explain_max_output_tokens
+
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], _TierStats] = {}
+
+    @classmethod
+    def from_settings(cls) -> "ModelRouter":
+        return cls(
+            fast_model=settings.llm_fast_model,
+            strong_model=settings.llm_strong_model,
+            parse_fast_max_tokens=settings.llm_parse_fast_max_tokens,
+            parse_max_input_tokens=settings.llm_parse_max_input_tokens,
+            parse_max_output_tokens=settings.llm_parse_max_output_tokens,
+            explain_max_input_tokens=settings.llm_explain_max_input_tokens,
+            explain_max_output_tokens=settings.llm_explain_max_output_tokens,
+        )
+
+    def _route(self, task: str, tier: str, max_tokens: int, input_tokens: int, trimmed: bool) -> Dict[str, Any]:
+        return {
+            "task": task,
+            "tier": tier,
+            "model": self.models[tier],
+            "max_tokens": max_tokens,
+            "input_tokens": input_tokens,
+            "trimmed": trimmed,
+        }
+
+    def route_parse(self, text: str) -> Tuple[Dict[str, Any], str]:
+        """Route an intake narrative; returns (route, possibly trimmed text)."""
+        tokens = estimate_tokens(text)
+        hard = tokens > self.parse_fast_max_tokens or is_mixed_script(text)
+        text, trimmed = trim_to_budget(text, self.parse_max_input_tokens)
+        route = self._route(
+            "parse", STRONG if hard else FAST, self.parse_max_output_tokens, estimate_tokens(text), trimmed
+        )
+        return route, text
+
+    def route_explain(self, extra_context: str) -> Tuple[Dict[str, Any], str]:
+        """Route an explanation rewrite; returns (route, trimmed guidance context)."""
+        extra_context, trimmed = trim_to_budget(extra_context or "", self.explain_max_input_tokens)
+        route = self._route(
+            "explain", FAST, self.explain_max_output_tokens, estimate_tokens(extra_context), trimmed
+        )
+        return route, extra_context
+
+    @contextmanager
+    def measure(self, route: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Time one provider call made with `route`.  Put the response's `usage`
+        into the yielded dict to record token counts.
+        """
+        call: Dict[str, Any] = {}
+        started = time.monotonic()
+        failed = False
+        try:
+            yield call
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            latency = time.monotonic() - started
+            usage = call.get("usage")
+            with self._lock:
+                key = (route["task"], route["tier"])
+                s = self._stats.get(key)
+                if s is None:
+                    s = self._stats[key] = _TierStats(route["model"])
+                s.calls += 1
+                s.trimmed += bool(route["trimmed"])
+                if failed:
+                    s.errors += 1
+                else:
+                    s.latency_total += latency
+                    s.latencies.append(latency)
+                if usage is not None:
+                    s.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+                    s.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tiers = {f"{task}/{tier}": s.as_dict() for (task, tier), s in sorted(self._stats.items())}
+        return {
+            "models": dict(self.models),
+            "limits": {
+                "parse_fast_max_tokens": self.parse_fast_max_tokens,
+                "parse_max_input_tokens": self.parse_max_input_tokens,
+                "parse_max_output_tokens": self.parse_max_output_tokens,
+                "explain_max_input_tokens": self.explain_max_input_tokens,
+                "explain_max_output_tokens": self.explain_max_output_tokens,
+            },
+            "tiers": tiers,
+        }
+
+
+model_router = ModelRouter.from_settings()
@@ -146,6 +146,9 @@ class ServiceRecommendation(BaseModel):
 
     explanation_client: str
     explanation_staff: str
+    # "llm" when the client explanation was rewritten by the LLM, "template"
+    # when it is the raw rule template (rules-only mode or no free LLM slot).
+    explanation_source: str = "llm"
 
     # Legacy flat score (kept for backwards compatibility)
     priority_score: float
@@ -166,5 +169,15 @@ class EvaluationResponse(BaseModel):
     recommendations: List[ServiceRecommendation]
     proof_package_id: str
 
+    # The response body doubles as the stored proof package, so it also
+    # carries the package's own id and creation timestamp.
+    case_id: Optional[str] = None
+    created_at: Optional[str] = None
+
     # Unified ticket-level priority for this case.
     ticket_priority: TicketPriority
+
+    # True when the LLM was overloaded and at least one client explanation is
+    # the raw rule template (explanation_template_en/fr) without LLM
+    # rewriting; see explanation_source on each recommendation.
+    degraded_mode: bool = False
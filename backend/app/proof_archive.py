@@ -0,0 +1,534 @@
+"""
+Archive tier for proof packages.
+
+Proof packages are written to logs/ as one JSON file per case (the "hot"
+tier; older packages are pretty-printed, newer ones are the compact
+evaluate response body).  They repeat the same rule templates, act sections
+and explanation text over and over, so old packages are compacted into an
+archive tier:
+
+- each package is re-encoded as compact JSON and compressed on its own with
+  zlib, primed with a shared dictionary trained from recent packages
+  (templates, sections and other frequent strings), so one case can be
+  decompressed without touching its neighbours;
+- compressed records are appended to one segment file per creation day;
+- a small SQLite index maps case_id -> (segment, offset, length, dict), so a
+  lookup is one B-tree probe plus one read, whatever the archive size;
+- a retention policy drops whole day segments (and stale hot files) once
+  they are older than `proof_retention_days`.
+
+`load_proof_bytes()` reads transparently from both tiers.
+
+Usage:
+
+    python -m app.proof_archive compact [--retrain]
+    python -m app.proof_archive expire
+    python -m app.proof_archive stats
+    python -m app.proof_archive get CASE-...
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from collections import Counter
+from itertools import groupby, islice
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Container, Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from .config import LOG_DIR, settings
+
+ARCHIVE_DIR = LOG_DIR / "archive"
+INDEX_PATH = ARCHIVE_DIR / "index.sqlite"
+
+SEGMENT_MAGIC = b"FRARCH01"
+# zlib 的 preset dictionary 最多用 32 KiB
+MAX_DICT_SIZE = 32 * 1024
+# 训练字典时最多看多少个 package
+TRAIN_SAMPLE_SIZE = 500
+# compact 每写多少个 package fsync + commit 一次
+COMPACT_BATCH_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS proofs (
+    case_id    TEXT PRIMARY KEY,
+    segment    TEXT NOT NULL,
+    offset     INTEGER NOT NULL,
+    length     INTEGER NOT NULL,
+    dict_id    TEXT NOT NULL,
+    created_on TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS proofs_created_on ON proofs (created_on);
+CREATE TABLE IF NOT EXISTS dictionaries (
+    dict_id    TEXT PRIMARY KEY,
+    trained_at TEXT NOT NULL
+);
+"""
+
+
+# --------------------------------------------------------------------------
+# Helpers
+# --------------------------------------------------------------------------
+
+
+def hot_path(case_id: str) -> Path:
+    return LOG_DIR / f"proof_{case_id}.json"
+
+
+def _compact(proof: Dict[str, Any]) -> bytes:
+    return json.dumps(proof, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _created_at(proof: Dict[str, Any], path: Path) -> datetime:
+    """Creation time of a package; older packages without `created_at` use the file mtime."""
+    raw = proof.get("created_at")
+    if raw:
+        try:
+            dt = datetime.fromisoformat(raw)
+            return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc)
+
+
+def _connect(readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        return sqlite3.connect(f"file:{INDEX_PATH}?mode=ro", uri=True)
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(INDEX_PATH)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _iter_hot() -> Iterator[Path]:
+    return LOG_DIR.glob("proof_*.json")
+
+
+def _read_old_hot(path: Path, cutoff_ts: float) -> Optional[Dict[str, Any]]:
+    """
+    Parse a hot package that may be older than `cutoff_ts`.
+
+    Returns None for files that cannot be read or parsed (e.g. still being
+    written) and, without opening them, for files modified after the cutoff.
+    """
+    try:
+        # package 在 created_at 之后立刻落盘，mtime 和 created_at 基本一致；
+        # mtime 还在窗口内的文件不用打开就跳过（热数据里绝大多数都是这种）
+        if path.stat().st_mtime >= cutoff_ts:
+            return None
+        with path.open(encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# --------------------------------------------------------------------------
+# Shared dictionary
+# --------------------------------------------------------------------------
+
+
+def _collect_strings(value: Any, counter: Counter) -> None:
+    if isinstance(value, dict):
+        for k, v in value.items():
+            counter[json.dumps(k, ensure_ascii=False)] += 1
+            _collect_strings(v, counter)
+    elif isinstance(value, list):
+        for v in value:
+            _collect_strings(v, counter)
+    elif isinstance(value, str) and len(value) >= 8:
+        counter[json.dumps(value, ensure_ascii=False)] += 1
+
+
+def train_dictionary(samples: Iterable[Dict[str, Any]]) -> bytes:
+    """
+    Build a zlib preset dictionary from sample packages.
+
+    Frequent strings (rule templates, act sections, explanation text, keys)
+    are ranked by how many bytes they would save; zlib reaches the END of the
+    dictionary most cheaply, so the most valuable strings go last.  One
+    compact package is appended as a structural skeleton.
+    """
+    counter: Counter = Counter()
+    skeleton = b""
+    for proof in samples:
+        _collect_strings(proof, counter)
+        if not skeleton:
+            skeleton = _compact(proof)
+
+    ranked = sorted(
+        (s for s, n in counter.items() if n > 1),
+        key=lambda s: counter[s] * len(s.encode("utf-8")),
+        reverse=True,
+    )
+
+    budget = MAX_DICT_SIZE - min(len(skeleton), MAX_DICT_SIZE // 4)
+    picked: List[bytes] = []
+    used = 0
+    for s in ranked:
+        blob = s.encode("utf-8")
+        if used + len(blob) > budget:
+            continue
+        picked.append(blob)
+        used += len(blob)
+
+    picked.reverse()
+    return (b"".join(picked) + skeleton[: MAX_DICT_SIZE // 4])[-MAX_DICT_SIZE:]
+
+
+def _dict_path(dict_id: str) -> Path:
+    return ARCHIVE_DIR / f"dict-{dict_id}.zdict"
+
+
+def save_dictionary(zdict: bytes) -> str:
+    dict_id = hashlib.sha256(zdict).hexdigest()[:12]
+    path = _dict_path(dict_id)
+    if not path.exists():
+        ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(zdict)
+        os.replace(tmp, path)
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO dictionaries (dict_id, trained_at) VALUES (?, ?)",
+            (dict_id, datetime.now(timezone.utc).isoformat(timespec="seconds")),
+        )
+    return dict_id
+
+
+_dict_cache: Dict[str, bytes] = {}
+
+
+def load_dictionary(dict_id: str) -> bytes:
+    zdict = _dict_cache.get(dict_id)
+    if zdict is None:
+        zdict = _dict_path(dict_id).read_bytes()
+        _dict_cache[dict_id] = zdict
+    return zdict
+
+
+def latest_dictionary_id() -> Optional[str]:
+    if not INDEX_PATH.exists():
+        return None
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT dict_id FROM dictionaries ORDER BY trained_at DESC, rowid DESC LIMIT 1"
+        ).fetchone()
+    return row[0] if row else None
+
+
+# --------------------------------------------------------------------------
+# Compaction / retention
+# --------------------------------------------------------------------------
+
+
+def _compress(data: bytes, zdict: bytes) -> bytes:
+    c = zlib.compressobj(level=9, wbits=-15, zdict=zdict)
+    return c.compress(data) + c.flush()
+
+
+def _decompress(data: bytes, zdict: bytes) -> bytes:
+    d = zlib.decompressobj(wbits=-15, zdict=zdict)
+    return d.decompress(data) + d.flush()
+
+
+def compact(
+    older_than_days: Optional[float] = None,
+    retrain: bool = False,
+) -> Dict[str, Any]:
+    """
+    Move hot packages older than `older_than_days` into day segments.
+
+    Safe to re-run after a crash: a hot file is only deleted once its record
+    is committed to the index, and already-indexed cases are just cleaned up.
+    Files that cannot be read or parsed (e.g. still being written) are left
+    in place for the next run.
+
+    Packages are streamed one at a time into their day's segment and
+    committed every `COMPACT_BATCH_SIZE` packages; only file names and days
+    are kept for the whole run.
+    """
+    if older_than_days is None:
+        older_than_days = settings.archive_after_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    cutoff_ts = cutoff.timestamp()
+
+    dict_id = None if retrain else latest_dictionary_id()
+    samples: List[Dict[str, Any]] = []
+
+    # 第一遍只记下 (day, case_id, path)；package 本身在写 segment 时再逐个读，
+    # 任何时候内存里最多只有一个 package（外加训练字典用的样本）
+    candidates: List[Tuple[str, str, Path]] = []
+    for path in _iter_hot():
+        proof = _read_old_hot(path, cutoff_ts)
+        if proof is None:
+            continue
+        created = _created_at(proof, path)
+        if created >= cutoff:
+            continue
+        case_id = proof.get("case_id") or path.stem[len("proof_"):]
+        candidates.append((created.date().isoformat(), case_id, path))
+        if dict_id is None and len(samples) < TRAIN_SAMPLE_SIZE:
+            samples.append(proof)
+
+    if not candidates:
+        return {"archived": 0, "hot_bytes": 0, "archived_bytes": 0}
+
+    if dict_id is None:
+        dict_id = save_dictionary(train_dictionary(samples))
+    del samples
+    zdict = load_dictionary(dict_id)
+
+    archived = hot_bytes = archived_bytes = 0
+    run_stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    candidates.sort(key=lambda c: c[0])
+
+    with _connect() as conn:
+        for day, group in groupby(candidates, key=lambda c: c[0]):
+            # 每次运行都用新的 segment 名字，不会覆盖已经登记过的 segment；
+            # 没有要写的 case 时不创建
+            segment = f"proof-{day}-{run_stamp}-{uuid4().hex[:12]}.seg"
+            f = None
+            offset = len(SEGMENT_MAGIC)
+            try:
+                while True:
+                    batch = list(islice(group, COMPACT_BATCH_SIZE))
+                    if not batch:
+                        break
+                    rows = []
+                    done_paths = []
+                    for _, case_id, path in batch:
+                        # 上次 commit 了但 hot 文件没删掉的 case 只需要清理
+                        known = conn.execute(
+                            "SELECT 1 FROM proofs WHERE case_id = ?", (case_id,)
+                        ).fetchone()
+                        if known:
+                            done_paths.append(path)
+                            continue
+                        try:
+                            raw = path.read_bytes()
+                            proof = json.loads(raw)
+                        except (OSError, ValueError):
+                            continue
+                        blob = _compress(_compact(proof), zdict)
+                        if f is None:
+                            f = (ARCHIVE_DIR / segment).open("xb")
+                            f.write(SEGMENT_MAGIC)
+                        f.write(blob)
+                        rows.append((case_id, segment, offset, len(blob), dict_id, day))
+                        offset += len(blob)
+                        hot_bytes += len(raw)
+                        archived_bytes += len(blob)
+                        done_paths.append(path)
+
+                    # 每批先 fsync segment、再 commit index、最后删 hot 文件
+                    if f is not None:
+                        f.flush()
+                        os.fsync(f.fileno())
+                    conn.executemany("INSERT INTO proofs VALUES (?, ?, ?, ?, ?, ?)", rows)
+                    conn.commit()
+                    archived += len(rows)
+                    for path in done_paths:
+                        path.unlink(missing_ok=True)
+            finally:
+                if f is not None:
+                    f.close()
+
+    return {
+        "archived": archived,
+        "dict_id": dict_id,
+        "hot_bytes": hot_bytes,
+        "archived_bytes": archived_bytes,
+        "ratio": round(hot_bytes / archived_bytes, 1) if archived_bytes else None,
+    }
+
+
+def expire(retention_days: Optional[float] = None) -> Dict[str, int]:
+    """
+    Enforce the retention policy on both tiers.
+
+    Archive segments are per creation day, so expiring is dropping whole
+    segment files plus their index rows.
+    """
+    if retention_days is None:
+        retention_days = settings.proof_retention_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    cutoff_day = cutoff.date().isoformat()
+
+    removed_hot = 0
+    for path in _iter_hot():
+        proof = _read_old_hot(path, cutoff.timestamp())
+        if proof is None:
+            continue
+        if _created_at(proof, path) < cutoff:
+            path.unlink(missing_ok=True)
+            removed_hot += 1
+
+    removed_archived = removed_segments = 0
+    if INDEX_PATH.exists():
+        with _connect() as conn:
+            segments = [
+                r[0]
+                for r in conn.execute(
+                    "SELECT DISTINCT segment FROM proofs WHERE created_on < ?", (cutoff_day,)
+                )
+            ]
+            removed_archived = conn.execute(
+                "DELETE FROM proofs WHERE created_on < ?", (cutoff_day,)
+            ).rowcount
+            conn.commit()
+        for segment in segments:
+            (ARCHIVE_DIR / segment).unlink(missing_ok=True)
+            removed_segments += 1
+
+    return {
+        "removed_hot": removed_hot,
+        "removed_archived": removed_archived,
+        "removed_segments": removed_segments,
+    }
+
+
+# --------------------------------------------------------------------------
+# Lookup
+# --------------------------------------------------------------------------
+
+
+def load_archived_bytes(case_id: str) -> Optional[bytes]:
+    """Compact JSON bytes of an archived package, or None if it is not archived."""
+    if not INDEX_PATH.exists():
+        return None
+    conn = _connect(readonly=True)
+    try:
+        row = conn.execute(
+            "SELECT segment, offset, length, dict_id FROM proofs WHERE case_id = ?",
+            (case_id,),
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+
+    segment, offset, length, dict_id = row
+    try:
+        with (ARCHIVE_DIR / segment).open("rb") as f:
+            f.seek(offset)
+            blob = f.read(length)
+    except FileNotFoundError:
+        # segment 刚被 retention 删掉
+        return None
+    return _decompress(blob, load_dictionary(dict_id))
+
+
+def load_proof_bytes(case_id: str) -> Optional[bytes]:
+    """JSON bytes of a proof package from the hot tier, falling back to the archive."""
+    try:
+        return hot_path(case_id).read_bytes()
+    except FileNotFoundError:
+        return load_archived_bytes(case_id)
+
+
+def iter_proofs(
+    exclude: Container[str] = frozenset(),
+) -> Iterator[Tuple[datetime, Dict[str, Any]]]:
+    """
+    Yield (created_at, package) for every package in both tiers, archive first.
+
+    Cases whose id is in `exclude` are skipped before they are read or
+    decompressed (hot files are matched by file name).
+    """
+    if INDEX_PATH.exists():
+        conn = _connect(readonly=True)
+        try:
+            rows = [
+                row[1:]
+                for row in conn.execute(
+                    "SELECT case_id, segment, offset, length, dict_id, created_on FROM proofs"
+                    " ORDER BY segment, offset"
+                )
+                if row[0] not in exclude
+            ]
+        finally:
+            conn.close()
+        dicts: Dict[str, bytes] = {}
+        for segment, group in groupby(rows, key=lambda r: r[0]):
+            try:
+                f = (ARCHIVE_DIR / segment).open("rb")
+            except FileNotFoundError:
+                continue
+            with f:
+                for _, offset, length, dict_id, created_on in group:
+                    if dict_id not in dicts:
+                        dicts[dict_id] = load_dictionary(dict_id)
+                    f.seek(offset)
+                    proof = json.loads(_decompress(f.read(length), dicts[dict_id]))
+                    if proof.get("created_at"):
+                        created = _created_at(proof, ARCHIVE_DIR / segment)
+                    else:
+                        # 没有 created_at 的旧 package 只知道归档时记下的日期
+                        created = datetime.fromisoformat(created_on).replace(tzinfo=timezone.utc)
+                    yield created, proof
+
+    for path in _iter_hot():
+        if path.stem[len("proof_"):] in exclude:
+            continue
+        try:
+            proof = json.loads(path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            # 刚被 compact 挪走，或者还没写完
+            continue
+        yield _created_at(proof, path), proof
+
+
+def stats() -> Dict[str, Any]:
+    hot = list(_iter_hot())
+    result: Dict[str, Any] = {
+        "hot_count": len(hot),
+        "hot_bytes": sum(p.stat().st_size for p in hot),
+        "archived_count": 0,
+        "archived_bytes": 0,
+        "segments": 0,
+    }
+    if INDEX_PATH.exists():
+        with _connect() as conn:
+            count, size, segments = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0), COUNT(DISTINCT segment) FROM proofs"
+            ).fetchone()
+        result.update(archived_count=count, archived_bytes=size, segments=segments)
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    cmd = argv[0] if argv else "stats"
+
+    if cmd == "compact":
+        print(json.dumps(compact(retrain="--retrain" in argv)))
+        return 0
+    if cmd == "expire":
+        print(json.dumps(expire()))
+        return 0
+    if cmd == "stats":
+        print(json.dumps(stats()))
+        return 0
+    if cmd == "get" and len(argv) > 1:
+        t0 = time.perf_counter()
+        data = load_proof_bytes(argv[1])
+        if data is None:
+            print("Case not found")
+            return 1
+        sys.stdout.write(data.decode("utf-8") + "\n")
+        print(f"({(time.perf_counter() - t0) * 1000:.2f} ms)", file=sys.stderr)
+        return 0
+
+    print("usage: python -m app.proof_archive [compact [--retrain] | expire | stats | get CASE_ID]")
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
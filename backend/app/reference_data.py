@@ -0,0 +1,575 @@
+"""
+Ingestion of service / program reference data.
+
+GC Service Inventory and GC InfoBase exports come as large CSV or XLSX
+files.  This module:
+
+1. streams them row by row (csv.DictReader, or iterparse over the XLSX
+   sheet XML, so memory does not grow with the file size);
+2. normalises the rows into a typed, column-oriented `ColumnTable`
+   (int/float columns are `array`s, low-cardinality text columns are
+   dictionary-encoded);
+3. caches each table in a compact binary file keyed by the sha256 of its
+   source, so restarts load the cache instead of re-parsing and only
+   changed sources are re-ingested.
+
+Usage:
+
+    python -m app.reference_data ingest            # (re)build caches
+    python -m app.reference_data bench --rows 50000
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import math
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+import zlib
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from xml.etree.ElementTree import iterparse
+
+from .config import settings
+from .storage import file_sha256
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
+CACHE_MAGIC = b"FRCOL001"
+_U32 = struct.Struct("<I")
+
+# int 列里的 NULL
+NULL_INT = -(2 ** 63)
+# 不同取值占行数比例低于这个值的文本列用字典编码
+DICT_ENCODE_RATIO = 0.5
+
+
+# --------------------------------------------------------------------------
+# Schemas: canonical column -> (dtype, accepted source headers)
+# --------------------------------------------------------------------------
+
+# dtype: str / int / float / list（逗号分隔的关键词）
+SERVICE_INVENTORY_SCHEMA: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "service_id": ("str", ("service_id", "service_id_number", "id")),
+    "service_name_en": ("str", ("service_name_en", "service_name_english", "name_en")),
+    "service_name_fr": ("str", ("service_name_fr", "service_name_french", "name_fr")),
+    "service_description_en": ("str", ("service_description_en", "description_en")),
+    "service_description_fr": ("str", ("service_description_fr", "description_fr")),
+    "service_scope": ("str", ("service_scope",)),
+    "service_type": ("str", ("service_type",)),
+    "keywords": ("list", ("keywords", "keywords_en")),
+    "organization_en": ("str", ("organization_en", "department_name_en", "org_name_en")),
+    "online_availability": ("str", ("online_availability", "online_end_to_end")),
+    "website_url_en": ("str", ("website_url_en", "service_url_en", "url_en")),
+}
+
+INFOBASE_PROGRAM_SCHEMA: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "program_id": ("str", ("program_id", "id")),
+    "program_name_en": ("str", ("program_name_en", "name_en")),
+    "program_name_fr": ("str", ("program_name_fr", "name_fr")),
+    "organization_en": ("str", ("organization_en", "department_name_en", "org_name_en")),
+    "latest_expenditure_millions": ("float", ("latest_expenditure_millions", "expenditure_millions")),
+    "latest_year": ("int", ("latest_year", "year", "fiscal_year")),
+}
+
+# 数据集名 -> (源文件, schema)
+DATASETS: Dict[str, Tuple[Path, Dict[str, Tuple[str, Tuple[str, ...]]]]] = {
+    "services": (DATA_DIR / "services_demo.csv", SERVICE_INVENTORY_SCHEMA),
+    "programs": (DATA_DIR / "programs.csv.xlsx", INFOBASE_PROGRAM_SCHEMA),
+}
+
+
+class ReferenceDataError(Exception):
+    """Raised when a source file cannot be read or a cache file is corrupt."""
+
+
+def _norm_header(h: str) -> str:
+    return h.strip().lower().replace(" ", "_").replace("-", "_")
+
+
+# --------------------------------------------------------------------------
+# Streaming readers
+# --------------------------------------------------------------------------
+
+
+def iter_csv_rows(path: Path) -> Iterator[Dict[str, str]]:
+    with path.open(newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+_XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_XLSX_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def _col_index(ref: str) -> int:
+    """'C12' -> 2"""
+    n = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        n = n * 26 + (ord(ch.upper()) - 64)
+    return n - 1
+
+
+def _first_sheet_part(zf: zipfile.ZipFile) -> str:
+    """
+    Zip member of the first worksheet, resolved through xl/workbook.xml and
+    its relationships (the first sheet is not necessarily sheet1.xml).
+    """
+    with zf.open("xl/workbook.xml") as f:
+        sheet = next((e for _, e in iterparse(f) if e.tag == f"{_XLSX_NS}sheet"), None)
+    if sheet is None:
+        raise KeyError("xl/workbook.xml lists no sheets")
+    rel_id = sheet.get(f"{_XLSX_REL_NS}id")
+
+    with zf.open("xl/_rels/workbook.xml.rels") as f:
+        for _, rel in iterparse(f):
+            if rel.tag == f"{_PKG_REL_NS}Relationship" and rel.get("Id") == rel_id:
+                target = rel.get("Target", "")
+                break
+        else:
+            raise KeyError(f"No workbook relationship {rel_id!r}")
+    # Target 相对于 xl/；以 / 开头时相对于包的根目录
+    return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+
+
+def iter_xlsx_rows(path: Path) -> Iterator[Dict[str, str]]:
+    """
+    Stream the first worksheet of an XLSX file as dicts keyed by the header row.
+
+    Uses iterparse and clears each <row> after reading it, so only the shared
+    string table is held in memory.
+    """
+    with zipfile.ZipFile(path) as zf:
+        names = set(zf.namelist())
+
+        shared: List[str] = []
+        if "xl/sharedStrings.xml" in names:
+            with zf.open("xl/sharedStrings.xml") as f:
+                for _, elem in iterparse(f):
+                    if elem.tag == f"{_XLSX_NS}si":
+                        shared.append("".join(t.text or "" for t in elem.iter(f"{_XLSX_NS}t")))
+                        elem.clear()
+
+        with zf.open(_first_sheet_part(zf)) as f:
+            header: Optional[List[str]] = None
+            for _, elem in iterparse(f):
+                if elem.tag != f"{_XLSX_NS}row":
+                    continue
+                cells: Dict[int, str] = {}
+                for i, c in enumerate(elem.iter(f"{_XLSX_NS}c")):
+                    idx = _col_index(c.get("r", "")) if c.get("r") else i
+                    kind = c.get("t")
+                    if kind == "inlineStr":
+                        value = "".join(t.text or "" for t in c.iter(f"{_XLSX_NS}t"))
+                    else:
+                        v = c.find(f"{_XLSX_NS}v")
+                        value = v.text if v is not None and v.text is not None else ""
+                        if kind == "s" and value:
+                            value = shared[int(value)]
+                    cells[idx] = value
+                elem.clear()
+
+                if header is None:
+                    width = max(cells) + 1 if cells else 0
+                    header = [cells.get(i, "") for i in range(width)]
+                    continue
+                yield {h: cells.get(i, "") for i, h in enumerate(header) if h}
+
+
+def iter_source_rows(path: Path) -> Iterator[Dict[str, str]]:
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        return iter_xlsx_rows(path)
+    return iter_csv_rows(path)
+
+
+# --------------------------------------------------------------------------
+# Column table
+# --------------------------------------------------------------------------
+
+
+class ColumnTable:
+    """
+    Typed, column-oriented table.
+
+    Column storage:
+      int   -> array('q'), NULL_INT for missing
+      float -> array('d'), NaN for missing
+      str / list -> ("plain", [str, ...]) or ("dict", [distinct values], array('I') codes)
+    """
+
+    def __init__(self, schema: Dict[str, str], row_count: int, data: Dict[str, Any]):
+        self.schema = schema
+        self.row_count = row_count
+        self._data = data
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def _value(self, name: str, i: int) -> Any:
+        dtype = self.schema[name]
+        col = self._data[name]
+        if dtype == "int":
+            v = col[i]
+            return None if v == NULL_INT else v
+        if dtype == "float":
+            v = col[i]
+            return None if math.isnan(v) else v
+        text = col[1][i] if col[0] == "plain" else col[1][col[2][i]]
+        if dtype == "list":
+            return [k for k in text.split(",") if k]
+        return text
+
+    def column(self, name: str) -> Sequence[Any]:
+        return [self._value(name, i) for i in range(self.row_count)]
+
+    def row(self, i: int) -> Dict[str, Any]:
+        return {name: self._value(name, i) for name in self.schema}
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self.row_count):
+            yield self.row(i)
+
+    # ----- binary cache format -----
+    #   magic | u32 header_len | header JSON | column blobs (in header order)
+    # 文本列是 zlib 压缩的 JSON；数值列和字典编码的 codes 是原始 array bytes
+
+    def to_bytes(self) -> bytes:
+        header: Dict[str, Any] = {"row_count": self.row_count, "columns": []}
+        blobs: List[bytes] = []
+        for name, dtype in self.schema.items():
+            col = self._data[name]
+            if dtype in ("int", "float"):
+                blob = col.tobytes()
+                header["columns"].append({"name": name, "dtype": dtype, "enc": "array", "len": len(blob)})
+                blobs.append(blob)
+            elif col[0] == "dict":
+                values = zlib.compress(json.dumps(col[1], ensure_ascii=False).encode("utf-8"), 1)
+                codes = col[2].tobytes()
+                header["columns"].append(
+                    {"name": name, "dtype": dtype, "enc": "dict", "len": len(values), "codes_len": len(codes)}
+                )
+                blobs += [values, codes]
+            else:
+                blob = zlib.compress(json.dumps(col[1], ensure_ascii=False).encode("utf-8"), 1)
+                header["columns"].append({"name": name, "dtype": dtype, "enc": "plain", "len": len(blob)})
+                blobs.append(blob)
+
+        head = json.dumps(header).encode("utf-8")
+        return CACHE_MAGIC + _U32.pack(len(head)) + head + b"".join(blobs)
+
+    @classmethod
+    def from_bytes(cls, buf: bytes) -> "ColumnTable":
+        if buf[:8] != CACHE_MAGIC:
+            raise ReferenceDataError("Not a reference-data cache file")
+        (head_len,) = _U32.unpack_from(buf, 8)
+        pos = 12 + head_len
+        header = json.loads(buf[12:pos])
+
+        schema: Dict[str, str] = {}
+        data: Dict[str, Any] = {}
+        for meta in header["columns"]:
+            name, dtype, enc = meta["name"], meta["dtype"], meta["enc"]
+            schema[name] = dtype
+            blob = buf[pos:pos + meta["len"]]
+            pos += meta["len"]
+            if enc == "array":
+                col = array("q" if dtype == "int" else "d")
+                col.frombytes(blob)
+                data[name] = col
+            elif enc == "dict":
+                codes = array("I")
+                codes.frombytes(buf[pos:pos + meta["codes_len"]])
+                pos += meta["codes_len"]
+                data[name] = ("dict", json.loads(zlib.decompress(blob)), codes)
+            else:
+                data[name] = ("plain", json.loads(zlib.decompress(blob)))
+        return cls(schema, header["row_count"], data)
+
+
+def _parse_int(raw: str) -> int:
+    raw = raw.strip().replace(",", "")
+    if not raw:
+        return NULL_INT
+    try:
+        return int(float(raw))
+    except ValueError:
+        return NULL_INT
+
+
+def _parse_float(raw: str) -> float:
+    raw = raw.strip().replace(",", "").replace("$", "")
+    try:
+        return float(raw) if raw else math.nan
+    except ValueError:
+        return math.nan
+
+
+def build_table(
+    rows: Iterator[Dict[str, str]],
+    schema: Dict[str, Tuple[str, Tuple[str, ...]]],
+) -> ColumnTable:
+    """Normalise streamed source rows into a ColumnTable using `schema`."""
+    dtypes = {name: spec[0] for name, spec in schema.items()}
+    ints = {n: array("q") for n, t in dtypes.items() if t == "int"}
+    floats = {n: array("d") for n, t in dtypes.items() if t == "float"}
+    # 文本列边读边做字典编码；distinct 太多时最后再摊平
+    texts = {n: ({}, array("I")) for n, t in dtypes.items() if t in ("str", "list")}
+
+    mapping: Optional[Dict[str, str]] = None  # canonical -> source header
+    row_count = 0
+    for row in rows:
+        if mapping is None:
+            by_norm = {_norm_header(h): h for h in row}
+            mapping = {}
+            for name, (_, aliases) in schema.items():
+                for alias in aliases:
+                    if alias in by_norm:
+                        mapping[name] = by_norm[alias]
+                        break
+
+        for name, dtype in dtypes.items():
+            source = mapping.get(name)
+            raw = (row.get(source) or "") if source else ""
+            if dtype == "int":
+                ints[name].append(_parse_int(raw))
+            elif dtype == "float":
+                floats[name].append(_parse_float(raw))
+            else:
+                text = raw.strip()
+                if dtype == "list":
+                    text = ",".join(k.strip() for k in text.split(",") if k.strip())
+                values, codes = texts[name]
+                code = values.get(text)
+                if code is None:
+                    code = values[text] = len(values)
+                codes.append(code)
+        row_count += 1
+
+    data: Dict[str, Any] = {}
+    data.update(ints)
+    data.update(floats)
+    for name, (values, codes) in texts.items():
+        distinct = list(values)
+        if row_count and len(distinct) > DICT_ENCODE_RATIO * row_count:
+            data[name] = ("plain", [distinct[c] for c in codes])
+        else:
+            data[name] = ("dict", distinct, codes)
+    return ColumnTable(dtypes, row_count, data)
+
+
+# --------------------------------------------------------------------------
+# Fingerprinted cache
+# --------------------------------------------------------------------------
+
+
+def _cache_dir() -> Path:
+    return Path(settings.reference_cache_dir)
+
+
+def _source_sha256(path: Path) -> str:
+    """
+    sha256 of a source file; reuses the hash recorded in the cache manifest
+    while the file's size and mtime are unchanged, so warm restarts do not
+    even re-read the source.
+    """
+    st = path.stat()
+    manifest_path = _cache_dir() / "manifest.json"
+    manifest: Dict[str, Any] = {}
+    if manifest_path.exists():
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except ValueError:
+            manifest = {}
+
+    key = str(path.resolve())
+    entry = manifest.get(key)
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["sha256"]
+
+    digest = file_sha256(path)
+
+    manifest[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_path.with_name(f".manifest.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, manifest_path)
+    return digest
+
+
+_ingest_lock = threading.Lock()
+
+
+def load_table(
+    path: Path,
+    schema: Dict[str, Tuple[str, Tuple[str, ...]]],
+) -> ColumnTable:
+    """
+    Return the ColumnTable for `path`, from cache when the source hash matches.
+
+    On a miss the source is streamed, normalised and written to
+    `<cache_dir>/<stem>-<sha>.frcol`; caches of older versions are removed.
+    """
+    # 同一进程里多个线程同时冷启动时只 ingest 一次，其余的等着读 cache
+    with _ingest_lock:
+        return _load_table(path, schema)
+
+
+def _load_table(
+    path: Path,
+    schema: Dict[str, Tuple[str, Tuple[str, ...]]],
+) -> ColumnTable:
+    digest = _source_sha256(path)
+    stem = path.name.split(".")[0]
+    cache_path = _cache_dir() / f"{stem}-{digest[:16]}.frcol"
+
+    if cache_path.exists():
+        try:
+            return ColumnTable.from_bytes(cache_path.read_bytes())
+        except (ReferenceDataError, ValueError, KeyError, zlib.error):
+            pass  # 坏掉的 cache 就重新 ingest
+
+    try:
+        table = build_table(iter_source_rows(path), schema)
+    except (OSError, KeyError, zipfile.BadZipFile, csv.Error) as exc:
+        raise ReferenceDataError(f"Cannot ingest {path}: {exc}") from exc
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(table.to_bytes())
+    os.replace(tmp, cache_path)
+    for old in cache_path.parent.glob(f"{stem}-*.frcol"):
+        if old != cache_path:
+            old.unlink(missing_ok=True)
+    return table
+
+
+def load_dataset(name: str) -> ColumnTable:
+    path, schema = DATASETS[name]
+    return load_table(path, schema)
+
+
+# --------------------------------------------------------------------------
+# CLI
+# --------------------------------------------------------------------------
+
+
+def _write_synthetic_inventory(path: Path, rows: int) -> None:
+    orgs = [
+        "Employment and Social Development Canada",
+        "Canada Revenue Agency",
+        "Immigration, Refugees and Citizenship Canada",
+        "Veterans Affairs Canada",
+    ]
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(list(SERVICE_INVENTORY_SCHEMA))
+        for i in range(rows):
+            w.writerow(
+                [
+                    f"SVC_{i:06d}",
+                    f"Service number {i}",
+                    f"Service numéro {i}",
+                    f"Description of service {i} for residents of Canada.",
+                    f"Description du service {i} pour les résidents du Canada.",
+                    "external",
+                    ("benefit", "grant", "permit")[i % 3],
+                    "benefit,family,income",
+                    orgs[i % len(orgs)],
+                    "yes" if i % 2 else "no",
+                    f"https://www.canada.ca/en/services/{i}.html",
+                ]
+            )
+
+
+def bench(rows: int) -> Dict[str, Any]:
+    """Load time and memory of a synthetic `rows`-row inventory: csv->Service vs cold/warm ingest."""
+    from .models import Service
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / "inventory.csv"
+        _write_synthetic_inventory(src, rows)
+        cache_dir = Path(tmp) / "cache"
+        saved_cache_dir = settings.reference_cache_dir
+        settings.reference_cache_dir = str(cache_dir)
+
+        def row_objects():
+            # 旧做法：逐行手工映射成 pydantic Service
+            out = []
+            for row in iter_csv_rows(src):
+                row["keywords"] = [k.strip() for k in row["keywords"].split(",") if k.strip()]
+                out.append(Service(**row))
+            return out
+
+        def clear_cache():
+            for p in cache_dir.glob("*"):
+                p.unlink()
+
+        def measure(fn, before=None):
+            # 计时和内存分两次跑：tracemalloc 本身会拖慢很多
+            if before:
+                before()
+            t0 = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - t0
+            if before:
+                before()
+            tracemalloc.start()
+            result = fn()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del result
+            return {
+                "seconds": round(elapsed, 3),
+                "retained_mib": round(current / 2**20, 1),
+                "peak_mib": round(peak / 2**20, 1),
+            }
+
+        try:
+            legacy = measure(row_objects)
+            cold = measure(lambda: load_table(src, SERVICE_INVENTORY_SCHEMA), before=clear_cache)
+            warm = measure(lambda: load_table(src, SERVICE_INVENTORY_SCHEMA))
+        finally:
+            settings.reference_cache_dir = saved_cache_dir
+        cache_bytes = sum(p.stat().st_size for p in cache_dir.glob("*.frcol"))
+        return {
+            "rows": rows,
+            "source_bytes": src.stat().st_size,
+            "cache_bytes": cache_bytes,
+            "csv_to_pydantic": legacy,
+            "ingest_cold": cold,
+            "ingest_warm": warm,
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    cmd = argv[0] if argv else "ingest"
+
+    if cmd == "ingest":
+        for name in DATASETS:
+            t0 = time.perf_counter()
+            table = load_dataset(name)
+            print(f"{name}: {len(table)} rows in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        return 0
+
+    if cmd == "bench":
+        rows = int(argv[argv.index("--rows") + 1]) if "--rows" in argv else 50000
+        print(json.dumps(bench(rows), indent=2))
+        return 0
+
+    print("usage: python -m app.reference_data [ingest | bench [--rows N]]")
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,311 @@
+"""
+Incrementally maintained triage rollups for staff dashboards.
+
+Answering "how many high-band cases, by service and by language, today"
+used to mean scanning every proof package.  Instead, every evaluated case
+bumps a small set of counters as it is produced:
+
+- cases, priority band, requires_human_review, degraded_mode;
+- preferred_language, province, fairness flags (single parent, disability,
+  accommodation, non-English, uncertain residency);
+- eligibility status per service;
+- band x language / service / province, for the common dashboard slices;
+- a 10-bin histogram of the priority score.
+
+Counters are kept per hour (for `rollup_hourly_retention_hours`) and per
+day (for `rollup_daily_retention_days`), plus all-time totals.  Each worker
+accumulates deltas in memory and merges them into logs/rollups.json under
+a file lock at most every `rollup_flush_seconds`, so several uvicorn
+workers (and the bulk importer) can share one file.  Reading a window only sums that
+window's buckets, so the cost does not grow with the number of cases.
+
+Usage:
+
+    python -m app.rollups show [--hours 24 | --days 30]
+    python -m app.rollups rebuild      # recount from all proof packages
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+
+from .config import LOG_DIR, settings
+from .rules_engine import UNCERTAIN_RESIDENCY
+from .storage import file_lock
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS_PATH = LOG_DIR / "rollups.json"
+
+HOUR_FORMAT = "%Y-%m-%dT%H"
+DAY_FORMAT = "%Y-%m-%d"
+SCORE_BINS = 10
+
+
+
+# --------------------------------------------------------------------------
+# Per-case counters
+# --------------------------------------------------------------------------
+
+
+def _part(value: Any) -> str:
+    """
+    One key segment from a (possibly client-supplied) value: "/" and "%" are
+    percent-escaped so a value like "ON/QC" stays a single segment.
+    """
+    return str(value).replace("%", "%25").replace("/", "%2F")
+
+
+def _unpart(segment: str) -> str:
+    return segment.replace("%2F", "/").replace("%25", "%")
+
+
+def case_counters(package: Dict[str, Any]) -> Counter:
+    """
+    Flat counter keys for one proof package, e.g. "band/high",
+    "eligibility/EI/eligible", "band_by_language/high/fr".
+    """
+    profile = package.get("case_profile") or {}
+    priority = package.get("ticket_priority") or {}
+
+    band = _part(priority.get("band") or "unknown")
+    language = _part(profile.get("preferred_language") or "unknown")
+    province = _part(profile.get("province") or "unknown")
+    score = float(priority.get("score") or 0.0)
+
+    c: Counter = Counter()
+    c["cases"] += 1
+    c[f"band/{band}"] += 1
+    c[f"language/{language}"] += 1
+    c[f"province/{province}"] += 1
+    c[f"band_by_language/{band}/{language}"] += 1
+    c[f"band_by_province/{band}/{province}"] += 1
+    c[f"score/{min(int(score * SCORE_BINS), SCORE_BINS - 1) / SCORE_BINS:.1f}"] += 1
+    if priority.get("requires_human_review"):
+        c["requires_human_review"] += 1
+    if package.get("degraded_mode"):
+        c["degraded_mode"] += 1
+
+    if profile.get("is_single_parent") and profile.get("children_count"):
+        c["flags/single_parent"] += 1
+    if profile.get("has_disability"):
+        c["flags/disability"] += 1
+    if profile.get("needs_accommodation"):
+        c["flags/accommodation"] += 1
+    if language != "en":
+        c["flags/non_english"] += 1
+    if profile.get("residency_status", "unknown") in UNCERTAIN_RESIDENCY:
+        c["flags/residency_uncertain"] += 1
+
+    for rec in package.get("recommendations") or []:
+        service_id = _part(rec.get("service_id") or "unknown")
+        c[f"eligibility/{service_id}/{_part(rec.get('eligibility_status') or 'unknown')}"] += 1
+        c[f"band_by_service/{band}/{service_id}"] += 1
+
+    return c
+
+
+def expand(flat: Dict[str, int]) -> Dict[str, Any]:
+    """Turn "a/b/c" counter keys into nested dicts for the API."""
+    out: Dict[str, Any] = {}
+    for key, value in sorted(flat.items()):
+        *parents, leaf = [_unpart(part) for part in key.split("/")]
+        node = out
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = value
+    return out
+
+
+# --------------------------------------------------------------------------
+# Persistent store
+# --------------------------------------------------------------------------
+
+
+def _empty() -> Dict[str, Any]:
+    return {"version": 1, "totals": {}, "hours": {}, "days": {}}
+
+
+def _add(into: Dict[str, int], delta: Dict[str, int]) -> None:
+    for key, value in delta.items():
+        into[key] = into.get(key, 0) + value
+
+
+def _read(path: Path) -> Dict[str, Any]:
+    try:
+        data = orjson.loads(path.read_bytes())
+    except FileNotFoundError:
+        return _empty()
+    except orjson.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict) or not all(isinstance(data.get(k), dict) for k in ("totals", "hours", "days")):
+        # 坏掉的文件不能让 evaluate / dashboard 失败；从空的重新累计，
+        # 历史计数可以用 `python -m app.rollups rebuild` 从 proof package 重算
+        logger.warning("%s is corrupt; starting from empty rollups (run `python -m app.rollups rebuild`)", path)
+        return _empty()
+    return data
+
+
+def _write(path: Path, data: Dict[str, Any]) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(orjson.dumps(data))
+    os.replace(tmp, path)
+
+
+def _prune(data: Dict[str, Any], now: datetime) -> None:
+    # bucket key 是定长的 ISO 字符串，直接按字典序比较
+    hour_cutoff = (now - timedelta(hours=settings.rollup_hourly_retention_hours)).strftime(HOUR_FORMAT)
+    day_cutoff = (now - timedelta(days=settings.rollup_daily_retention_days)).strftime(DAY_FORMAT)
+    data["hours"] = {k: v for k, v in data["hours"].items() if k >= hour_cutoff}
+    data["days"] = {k: v for k, v in data["days"].items() if k >= day_cutoff}
+
+
+class Rollups:
+    """Per-worker delta buffer in front of the shared rollups file."""
+
+    def __init__(self, path: Path = ROLLUPS_PATH, flush_seconds: Optional[float] = None):
+        self.path = path
+        self.flush_seconds = (
+            settings.rollup_flush_seconds if flush_seconds is None else flush_seconds
+        )
+        self._lock = threading.Lock()
+        self._pending_hours: Dict[str, Counter] = defaultdict(Counter)
+        self._last_flush = time.monotonic()
+        # 读路径缓存：文件没变就不重新解析
+        self._cached: Optional[Tuple[Tuple[int, int], Dict[str, Any]]] = None
+
+    def record(self, package: Dict[str, Any], created: Optional[datetime] = None) -> None:
+        """Count one evaluated case; cheap enough to call on the evaluate path."""
+        created = created or datetime.now(timezone.utc)
+        delta = case_counters(package)
+        with self._lock:
+            self._pending_hours[created.strftime(HOUR_FORMAT)].update(delta)
+            due = time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Merge this worker's pending deltas into the shared file."""
+        with self._lock:
+            pending, self._pending_hours = self._pending_hours, defaultdict(Counter)
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        with file_lock(self.path):
+            data = _read(self.path)
+            for hour, delta in pending.items():
+                _add(data["totals"], delta)
+                _add(data["hours"].setdefault(hour, {}), delta)
+                _add(data["days"].setdefault(hour[:10], {}), delta)
+            _prune(data, datetime.now(timezone.utc))
+            _write(self.path, data)
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return _empty()
+        key = (st.st_mtime_ns, st.st_size)
+        if self._cached is None or self._cached[0] != key:
+            self._cached = (key, _read(self.path))
+        return self._cached[1]
+
+    def query(self, hours: Optional[int] = None, days: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Counters for the last `hours` hourly buckets or the last `days` daily
+        buckets (default: last 24 hours), plus all-time totals.
+        """
+        self.flush()
+        data = self._load()
+        now = datetime.now(timezone.utc)
+
+        # 超过保留期的 bucket 已经被清掉了，窗口不会比保留期更长
+        if days is not None:
+            days = min(days, settings.rollup_daily_retention_days)
+            keys = [(now - timedelta(days=i)).strftime(DAY_FORMAT) for i in range(days)]
+            buckets = data["days"]
+            window = {"days": days}
+        else:
+            hours = min(24 if hours is None else hours, settings.rollup_hourly_retention_hours)
+            keys = [(now - timedelta(hours=i)).strftime(HOUR_FORMAT) for i in range(hours)]
+            buckets = data["hours"]
+            window = {"hours": hours}
+
+        counts: Dict[str, int] = {}
+        for key in keys:
+            if key in buckets:
+                _add(counts, buckets[key])
+
+        window.update({"from": keys[-1] if keys else None, "to": keys[0] if keys else None})
+        return {
+            "window": window,
+            "counts": expand(counts),
+            "totals": expand(data["totals"]),
+        }
+
+
+def rebuild(path: Path = ROLLUPS_PATH, packages: Optional[Iterable[Tuple[datetime, Dict[str, Any]]]] = None) -> int:
+    """Recount everything from the stored proof packages (hot + archive)."""
+    if packages is None:
+        from .proof_archive import iter_proofs
+
+        packages = iter_proofs()
+
+    data = _empty()
+    n = 0
+    for created, package in packages:
+        created = created.astimezone(timezone.utc)
+        delta = case_counters(package)
+        _add(data["totals"], delta)
+        _add(data["hours"].setdefault(created.strftime(HOUR_FORMAT), {}), delta)
+        _add(data["days"].setdefault(created.strftime(DAY_FORMAT), {}), delta)
+        n += 1
+    _prune(data, datetime.now(timezone.utc))
+
+    with file_lock(path):
+        _write(path, data)
+    return n
+
+
+rollups = Rollups()
+# worker 退出时把还没落盘的增量写掉
+atexit.register(rollups.flush)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    cmd = argv[0] if argv else "show"
+
+    if cmd == "rebuild":
+        t0 = time.perf_counter()
+        n = rebuild()
+        print(json.dumps({"cases": n, "seconds": round(time.perf_counter() - t0, 2)}))
+        return 0
+    if cmd == "show":
+        hours = days = None
+        if "--hours" in argv:
+            hours = int(argv[argv.index("--hours") + 1])
+        if "--days" in argv:
+            days = int(argv[argv.index("--days") + 1])
+        print(json.dumps(rollups.query(hours=hours, days=days), ensure_ascii=False, indent=2))
+        return 0
+
+    print("usage: python -m app.rollups [show [--hours N | --days N] | rebuild]")
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
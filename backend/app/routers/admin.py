@@ -1,8 +1,56 @@
-from fastapi import APIRouter
-from ..rules_engine import load_rules
+from typing import Optional
+
+from fastapi import APIRouter, Query
+from ..admission import admission
+from ..case_feed import case_feed
+from ..config import settings
+from ..model_router import model_router
+from ..rollups import rollups
+from ..speculative import speculative
+from ..triage import get_rules
 
 router = APIRouter()
 
 @router.get("/admin/rules")
 def list_rules():
-    return load_rules()
+    # 和 evaluate 用同一个 getter，返回的就是正在生效的规则
+    return dict(get_rules())
+
+
+@router.get("/admin/admission")
+def admission_status():
+    """Current LLM admission-control state for this worker."""
+    return admission.stats()
+
+
+@router.get("/admin/feed")
+def feed_status():
+    """Staff case feed: subscribers, events published / delivered / dropped."""
+    return case_feed.stats()
+
+
+@router.get("/admin/llm")
+def llm_routing():
+    """LLM model tiers, prompt budgets and per-tier latency / token usage."""
+    return model_router.stats()
+
+
+@router.get("/admin/speculative")
+def speculative_status():
+    """Speculative evaluation cache: size and hit / join / miss counts."""
+    return speculative.stats()
+
+
+@router.get("/admin/rollups")
+def triage_rollups(
+    # 超过保留期的窗口没有数据可算，直接 422
+    hours: Optional[int] = Query(None, ge=1, le=settings.rollup_hourly_retention_hours),
+    days: Optional[int] = Query(None, ge=1, le=settings.rollup_daily_retention_days),
+):
+    """
+    Caseload counters for the last `hours` (default 24) or `days`:
+    bands, human review, languages, provinces, fairness flags and
+    eligibility per service, plus all-time totals.  Windows are limited to
+    the hourly / daily bucket retention.
+    """
+    return rollups.query(hours=hours, days=days)
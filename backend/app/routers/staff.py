@@ -1,17 +1,69 @@
-from fastapi import APIRouter, HTTPException
-from pathlib import Path
-import json
-from typing import Any, Dict
+import asyncio
+from typing import Optional, Set
 
-router = APIRouter()
+from fastapi import APIRouter, HTTPException, Response, WebSocket, WebSocketDisconnect
+
+from ..case_feed import Subscription, case_feed
+from ..proof_archive import load_proof_bytes
 
-LOG_DIR = Path(__file__).resolve().parents[2] / "logs"
+router = APIRouter()
 
 
 @router.get("/staff/case/{case_id}")
-def get_case(case_id: str) -> Dict[str, Any]:
-    path = LOG_DIR / f"proof_{case_id}.json"
-    if not path.exists():
+def get_case(case_id: str) -> Response:
+    # 先读 logs/ 下的 hot 文件，找不到再去压缩归档里找；
+    # 存下来的 proof package 本身就是 JSON，bytes 原样返回，不再 json.load 一遍
+    data = load_proof_bytes(case_id)
+    if data is None:
         raise HTTPException(status_code=404, detail="Case not found")
-    with path.open(encoding="utf-8") as f:
-        return json.load(f)
+    return Response(content=data, media_type="application/json")
+
+
+def _split(value: Optional[str]) -> Optional[Set[str]]:
+    if not value:
+        return None
+    return {v.strip() for v in value.split(",") if v.strip()} or None
+
+
+async def _send_events(websocket: WebSocket, sub: Subscription) -> None:
+    while True:
+        await websocket.send_text(await sub.next_text())
+
+
+async def _wait_for_close(websocket: WebSocket) -> None:
+    # 客户端不需要发消息；这里只是为了及时发现断开
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+@router.websocket("/staff/feed")
+async def case_feed_ws(
+    websocket: WebSocket,
+    band: Optional[str] = None,
+    service: Optional[str] = None,
+) -> None:
+    """
+    Live feed of newly evaluated cases (case summaries, JSON text frames).
+
+    Optional filters, comma-separated: `?band=high,medium&service=EI_REGULAR`.
+    A `{"type": "feed.lagged", "dropped": n}` frame means this client fell
+    behind and missed n events; re-sync through /staff/case/{case_id}.
+    """
+    await websocket.accept()
+    sub = case_feed.subscribe(bands=_split(band), services=_split(service))
+    sender = asyncio.create_task(_send_events(websocket, sub))
+    closer = asyncio.create_task(_wait_for_close(websocket))
+    try:
+        done, pending = await asyncio.wait(
+            {sender, closer}, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in pending:
+            task.cancel()
+        for task in done:
+            exc = task.exception()
+            if exc is not None and not isinstance(exc, WebSocketDisconnect):
+                raise exc
+    finally:
+        case_feed.unsubscribe(sub)
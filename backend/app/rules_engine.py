@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 import yaml
 import json
 
@@ -114,6 +114,7 @@ def evaluate_service(
     service: Service,
     rules_for_service: Dict[str, Any],
     guides: Dict[str, Any],
+    use_llm: bool = True,
 ) -> Dict[str, Any]:
     """
     Evaluate a single service against a CaseProfile.
@@ -122,6 +123,7 @@ def evaluate_service(
     - First rule whose 'condition' evals to True "fires"
     - That rule's 'outcome' becomes the eligibility_status
     - Build staff + client explanations based on fired rules + guidance
+      (with use_llm=False the client explanation is the raw rule template)
     """
     fired_rules: List[Dict[str, Any]] = []
     eligibility_status = "need_more_info"
@@ -167,8 +169,8 @@ def evaluate_service(
 
     staff_expl = build_staff_explanation(service, fired_rules, guide)
     preferred_language = profile.preferred_language
-    client_expl = build_client_explanation(
-        service, fired_rules, guide, preferred_language
+    client_expl, explanation_source = build_client_explanation(
+        service, fired_rules, guide, preferred_language, use_llm=use_llm
     )
 
     return {
@@ -177,16 +179,31 @@ def evaluate_service(
         "fired_rules": fired_rules,
         "staff_explanation": staff_expl,
         "client_explanation": client_expl,
+        "explanation_source": explanation_source,
         "guide": guide,
     }
 
 
-def compute_priority_score(profile: CaseProfile) -> Tuple[float, List[str]]:
+# 这些 residency_status 视为“身份不确定”：加分，并且需要人工复核
+UNCERTAIN_RESIDENCY = {"temporary_resident", "refugee_claimant", "other", "unknown"}
+
+
+def compute_priority_score(
+    profile: CaseProfile,
+    cfg: Optional[Dict[str, Any]] = None,
+    eligibility_statuses: Iterable[str] = (),
+) -> Tuple[float, List[str]]:
     """
     Compute a simple priority score (0–1) plus human-readable reasons
     based on priority_rules.yaml config.
+
+    `cfg` can be passed in by callers that already hold the config
+    (e.g. from the reference snapshot) to avoid re-reading the YAML.
+    `eligibility_statuses` are the outcomes of the matched services; an
+    unresolved `need_more_info` adds to the score.
     """
-    cfg = load_priority_config()
+    if cfg is None:
+        cfg = load_priority_config()
     w = cfg.get("weights", {})
 
     reasons: List[str] = []
@@ -218,4 +235,52 @@ def compute_priority_score(profile: CaseProfile) -> Tuple[float, List[str]]:
         score += w.get("high_unemployment_province", 0.1)
         reasons.append("Higher unemployment in province")
 
+    # Residency uncertainty
+    if profile.residency_status in UNCERTAIN_RESIDENCY:
+        score += w.get("residency_uncertain", 0.0)
+        reasons.append("Residency status is uncertain")
+
+    # Unresolved eligibility
+    if "need_more_info" in eligibility_statuses:
+        score += w.get("need_more_info", 0.0)
+        reasons.append("Eligibility for key benefits is still uncertain (need_more_info)")
+
     return min(score, 1.0), reasons
+
+
+def compute_ticket_priority(
+    profile: CaseProfile,
+    cfg: Optional[Dict[str, Any]] = None,
+    eligibility_statuses: Iterable[str] = (),
+) -> Dict[str, Any]:
+    """
+    Unified ticket-level priority: score + band + human-review flag + reasons.
+
+    Bands come from `thresholds` in priority_rules.yaml.  A case needs human
+    review when it is high-band, its residency status is uncertain, or any
+    matched service is still `need_more_info`.
+    """
+    if cfg is None:
+        cfg = load_priority_config()
+
+    statuses = list(eligibility_statuses)
+    score, reasons = compute_priority_score(profile, cfg, statuses)
+
+    thresholds = cfg.get("thresholds", {}) or {}
+    if score >= thresholds.get("high_priority", 0.8):
+        band = "high"
+    elif score >= thresholds.get("medium_priority", 0.5):
+        band = "medium"
+    else:
+        band = "low"
+
+    return {
+        "score": score,
+        "band": band,
+        "requires_human_review": (
+            band == "high"
+            or profile.residency_status in UNCERTAIN_RESIDENCY
+            or "need_more_info" in statuses
+        ),
+        "reasons": reasons,
+    }
@@ -1,34 +1,23 @@
-import csv
-from pathlib import Path
 from typing import List
 
 from .models import Service, CaseProfile
-
-DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+from .reference_data import load_dataset
 
 
 def load_services() -> List[Service]:
-    services: List[Service] = []
-    path = DATA_DIR / "services_demo.csv"
-    with path.open(newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            services.append(
-                Service(
-                    service_id=row["service_id"],
-                    service_name_en=row["service_name_en"],
-                    service_name_fr=row["service_name_fr"],
-                    service_description_en=row["service_description_en"],
-                    service_description_fr=row["service_description_fr"],
-                    service_scope=row["service_scope"],
-                    service_type=row["service_type"],
-                    keywords=[k.strip() for k in row["keywords"].split(",") if k.strip()],
-                    organization_en=row["organization_en"],
-                    online_availability=row["online_availability"],
-                    website_url_en=row["website_url_en"],
-                )
-            )
-    return services
+    """
+    Build Service objects from the ingested service inventory.
+
+    The CSV/XLSX source is parsed (and column-mapped) by app.reference_data
+    and cached by file hash, so this is a cache read on most restarts.
+    """
+    table = load_dataset("services")
+    return [Service(**row) for row in table.iter_rows()]
+
+
+def load_programs() -> List[dict]:
+    """GC InfoBase program rows (data/programs.csv.xlsx) as plain dicts."""
+    return list(load_dataset("programs").iter_rows())
 
 
 def match_services(profile: CaseProfile, all_services: List[Service]) -> List[Service]:
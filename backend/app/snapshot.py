@@ -0,0 +1,511 @@
+"""
+Read-only binary snapshot of the compiled reference data.
+
+Every uvicorn/gunicorn worker used to parse rules.yaml, priority_rules.yaml,
+services_demo.csv and program_guides.json on its own.  `build_snapshot()`
+compiles all of them into ONE file; workers then mmap that file, so the raw
+bytes live once in the OS page cache and are shared by all workers.
+
+Services, rules and guides are stored as one encoded row per id plus an
+id -> (offset, length) index.  Workers only keep the indexes; a row is
+decoded when a request asks for it and dropped afterwards, so the reference
+data itself is not duplicated into every worker's heap.
+
+The snapshot records the size, mtime and sha256 of each source file.  A
+worker only uses it while the sources still match; after an edit to e.g.
+rules.yaml it falls back to reading the sources until the snapshot is
+rebuilt.
+
+File layout (little endian):
+
+    header   : magic(8) | format_version(u32) | section_count(u32)
+    directory: section_count * ( name(16, NUL padded) | offset(u64) | length(u64) )
+    payload  : raw section bytes
+
+Usage:
+
+    python -m app.snapshot build     # compile + publish atomically
+    python -m app.snapshot status    # is the snapshot in use / stale?
+    python -m app.snapshot report    # boot time / memory per worker
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .config import settings
+from .models import Service
+from .rules_engine import (
+    CONFIG_DIR,
+    DATA_DIR,
+    load_rules,
+    load_program_guides,
+    load_priority_config,
+)
+from .service_matcher import load_services
+from .storage import file_sha256
+
+MAGIC = b"FRSNAP\x00\x01"
+FORMAT_VERSION = 2
+
+_HEADER = struct.Struct("<8sII")
+_ENTRY = struct.Struct("<16sQQ")
+
+# 编进 snapshot 的源文件；meta 里记录它们的 size / mtime / sha256，用来判断 snapshot 是否过期
+SOURCE_FILES = [
+    CONFIG_DIR / "rules.yaml",
+    CONFIG_DIR / "priority_rules.yaml",
+    DATA_DIR / "services_demo.csv",
+    DATA_DIR / "program_guides.json",
+]
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, truncated or of an unknown format."""
+
+
+def _dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# --------------------------------------------------------------------------
+# Build
+# --------------------------------------------------------------------------
+
+
+def _source_fingerprints() -> Dict[str, Dict[str, Any]]:
+    result = {}
+    for p in SOURCE_FILES:
+        if p.exists():
+            st = p.stat()
+            result[p.name] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "sha256": file_sha256(p),
+            }
+    return result
+
+
+def _rows(items: Mapping[str, Any]) -> Tuple[bytes, bytes]:
+    """Encode a mapping as (concatenated rows, id -> (offset, length) index)."""
+    rows = bytearray()
+    index: Dict[str, Tuple[int, int]] = {}
+    for key, value in items.items():
+        blob = _dumps(value)
+        index[key] = (len(rows), len(blob))
+        rows += blob
+    return bytes(rows), _dumps(index)
+
+
+def compile_sections() -> Dict[str, bytes]:
+    """
+    Load every reference source once and encode it into snapshot sections.
+
+    Services, rules and guides are stored row by row with an id index, so a
+    single entry can be decoded without touching the others.
+    """
+    # 先记录源文件指纹再读内容：读的过程中文件被改，下次检查就会发现
+    sources = _source_fingerprints()
+    services = load_services()
+
+    svc_rows, svc_index = _rows({s.service_id: s.dict() for s in services})
+    rules_rows, rules_index = _rows(load_rules())
+    guides_rows, guides_index = _rows(load_program_guides())
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "sources": sources,
+        "service_count": len(services),
+    }
+
+    return {
+        "meta": _dumps(meta),
+        "priority": _dumps(load_priority_config()),
+        "svc_rows": svc_rows,
+        "svc_index": svc_index,
+        "rules_rows": rules_rows,
+        "rules_index": rules_index,
+        "guides_rows": guides_rows,
+        "guides_index": guides_index,
+    }
+
+
+def write_snapshot(sections: Dict[str, bytes], path: Path) -> Path:
+    """
+    Write `sections` to `path` atomically.
+
+    The file is written next to the target and then `os.replace`d, so a
+    worker either sees the old snapshot or the complete new one.  Workers
+    that still have the old file mapped keep reading the old inode.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    names = list(sections)
+    offset = _HEADER.size + _ENTRY.size * len(names)
+    directory = bytearray()
+    for name in names:
+        encoded = name.encode("ascii")
+        if len(encoded) > 16:
+            raise ValueError(f"Section name too long: {name!r}")
+        directory += _ENTRY.pack(encoded, offset, len(sections[name]))
+        offset += len(sections[name])
+
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with tmp_path.open("wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(names)))
+        f.write(directory)
+        for name in names:
+            f.write(sections[name])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def build_snapshot(path: Optional[Path] = None) -> Path:
+    """Compile the reference data and publish it to `path` (defaults to settings)."""
+    target = Path(path or settings.snapshot_path)
+    return write_snapshot(compile_sections(), target)
+
+
+# --------------------------------------------------------------------------
+# Read
+# --------------------------------------------------------------------------
+
+
+class RowMapping(Mapping):
+    """
+    Read-only id -> value mapping over a row section of the snapshot.
+
+    Only the index is held in memory; each lookup decodes its row from the
+    mapping and the result is not cached.
+    """
+
+    def __init__(self, rows: memoryview, index: Dict[str, List[int]], decode: Callable[[bytes], Any] = json.loads):
+        self._rows = rows
+        self._index = index
+        self._decode = decode
+
+    def __getitem__(self, key: str) -> Any:
+        offset, length = self._index[key]
+        return self._decode(bytes(self._rows[offset:offset + length]))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class LazyService:
+    """
+    Stand-in for a `Service` from the snapshot: `service_id` is known up
+    front, every other attribute decodes the row on first use.  Matching
+    only looks at ids, so unmatched services are never decoded.
+    """
+
+    __slots__ = ("service_id", "_rows", "_span", "_service")
+
+    def __init__(self, service_id: str, rows: memoryview, span: List[int]):
+        self.service_id = service_id
+        self._rows = rows
+        self._span = span
+        self._service: Optional[Service] = None
+
+    def __getattr__(self, name: str) -> Any:
+        if self._service is None:
+            offset, length = self._span
+            self._service = Service(**json.loads(bytes(self._rows[offset:offset + length])))
+        return getattr(self._service, name)
+
+
+class ServiceRows(Sequence):
+    """The services of a snapshot as a sequence of `LazyService`s."""
+
+    def __init__(self, rows: memoryview, index: Dict[str, List[int]]):
+        self._rows = rows
+        self._items = list(index.items())
+
+    def __getitem__(self, i):  # type: ignore[override]
+        if isinstance(i, slice):
+            return [LazyService(k, self._rows, span) for k, span in self._items[i]]
+        service_id, span = self._items[i]
+        return LazyService(service_id, self._rows, span)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class Snapshot:
+    """
+    A memory-mapped, read-only view over a snapshot file.
+
+    Section bytes are exposed as zero-copy memoryviews into the mapping.
+    Only the small sections (meta, priority config, indexes) are decoded
+    and kept; rows are decoded per lookup.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size < _HEADER.size:
+                raise SnapshotError(f"Snapshot too small: {self.path}")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # (inode, mtime) 用来判断文件是否被新版本替换
+        self.identity = (st.st_ino, st.st_mtime_ns)
+
+        buf = memoryview(self._mm)
+        magic, version, count = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format in {self.path}")
+
+        self._sections: Dict[str, memoryview] = {}
+        for i in range(count):
+            raw_name, offset, length = _ENTRY.unpack_from(buf, _HEADER.size + i * _ENTRY.size)
+            if offset + length > len(buf):
+                raise SnapshotError(f"Truncated snapshot section in {self.path}")
+            name = raw_name.rstrip(b"\x00").decode("ascii")
+            self._sections[name] = buf[offset:offset + length]
+
+        self.meta: Dict[str, Any] = self._json("meta")
+        self._priority: Dict[str, Any] = self._json("priority")
+        self._rules = RowMapping(self.section("rules_rows"), self._json("rules_index"))
+        self._guides = RowMapping(self.section("guides_rows"), self._json("guides_index"))
+        self._services = ServiceRows(self.section("svc_rows"), self._json("svc_index"))
+
+    def section(self, name: str) -> memoryview:
+        try:
+            return self._sections[name]
+        except KeyError:
+            raise SnapshotError(f"Snapshot has no section {name!r}") from None
+
+    def _json(self, name: str) -> Any:
+        return json.loads(bytes(self.section(name)))
+
+    def rules(self) -> Mapping[str, Any]:
+        return self._rules
+
+    def priority_config(self) -> Dict[str, Any]:
+        return self._priority
+
+    def guides(self) -> Mapping[str, Any]:
+        return self._guides
+
+    def services(self) -> Sequence[LazyService]:
+        return self._services
+
+    def stale_sources(self) -> List[str]:
+        """Names of source files that no longer match what the snapshot was built from."""
+        recorded = self.meta.get("sources", {})
+        stale = [name for name in recorded if name not in {p.name for p in SOURCE_FILES}]
+        for p in SOURCE_FILES:
+            if not _source_matches(p, recorded.get(p.name)):
+                stale.append(p.name)
+        return stale
+
+    def close(self) -> None:
+        # memoryview 还被引用时 mmap 不能 close；交给 GC 处理即可
+        self._sections.clear()
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+
+
+# (path, size, mtime_ns) -> sha256；mtime 变了但内容没变（touch / 重新 checkout）时不用反复 hash
+_sha_cache: Dict[Tuple[str, int, int], str] = {}
+
+
+def _source_matches(path: Path, recorded: Optional[Dict[str, Any]]) -> bool:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return recorded is None
+    if recorded is None:
+        return False
+    if st.st_size == recorded["size"] and st.st_mtime_ns == recorded["mtime_ns"]:
+        return True
+    if st.st_size != recorded["size"]:
+        return False
+    key = (str(path), st.st_size, st.st_mtime_ns)
+    if key not in _sha_cache:
+        _sha_cache[key] = file_sha256(path)
+    return _sha_cache[key] == recorded["sha256"]
+
+
+_current: Optional[Snapshot] = None
+# snapshot 存在但源文件已经改过时为 True：这时 current_snapshot() 返回 None
+_stale = False
+_last_check = 0.0
+_sources_version: Tuple[Any, ...] = ()
+_current_lock = threading.Lock()
+
+
+def _identity(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+
+
+def _stat_sources() -> Tuple[Any, ...]:
+    result = []
+    for p in SOURCE_FILES:
+        try:
+            st = p.stat()
+            result.append((p.name, st.st_size, st.st_mtime_ns))
+        except FileNotFoundError:
+            result.append((p.name, None, None))
+    return tuple(result)
+
+
+def _recheck() -> None:
+    """Re-stat the snapshot and the source files; call with _current_lock held."""
+    global _current, _stale, _last_check, _sources_version
+
+    _last_check = time.monotonic()
+    _sources_version = _stat_sources()
+
+    path = Path(settings.snapshot_path)
+    identity = _identity(path)
+    if identity is None:
+        _current = None
+    elif _current is None or _current.identity != identity:
+        try:
+            _current = Snapshot(path)
+        except (OSError, SnapshotError):
+            # 文件坏了就保留旧版本（或退回到直接读源文件）
+            pass
+    _stale = _current is not None and bool(_current.stale_sources())
+
+
+def current_snapshot() -> Optional[Snapshot]:
+    """
+    Return the snapshot for this worker, or None when no snapshot was built
+    or its source files have changed since it was built.
+
+    The snapshot file and the sources are re-stat'ed at most every
+    `snapshot_recheck_seconds`; an atomically replaced snapshot is mapped
+    and returned, so a rebuild is picked up without restarting workers.
+    """
+    if time.monotonic() - _last_check >= settings.snapshot_recheck_seconds:
+        with _current_lock:
+            if time.monotonic() - _last_check >= settings.snapshot_recheck_seconds:
+                _recheck()
+    return None if _stale else _current
+
+
+def sources_version() -> Tuple[Any, ...]:
+    """
+    (name, size, mtime) of every source file as of the last recheck; callers
+    that cache parsed sources reload them when this changes.
+    """
+    current_snapshot()
+    return _sources_version
+
+
+# --------------------------------------------------------------------------
+# CLI: build / report
+# --------------------------------------------------------------------------
+
+
+def _rss_kib() -> int:
+    """Current resident set size in KiB (Linux), falling back to peak RSS."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _probe(mode: str) -> Dict[str, Any]:
+    """Load the reference data the way one worker would and measure it."""
+    rss_before = _rss_kib()
+    t0 = time.perf_counter()
+    if mode == "snapshot":
+        snap = Snapshot(Path(settings.snapshot_path))
+        refs = (snap.rules(), snap.priority_config(), snap.guides(), snap.services())
+    else:
+        refs = (load_rules(), load_priority_config(), load_program_guides(), load_services())
+    rules, _, guides, services = refs
+    # 和一次 evaluate 一样访问数据：遍历 service id，取匹配到的规则和 guide
+    for svc in services:
+        rules.get(svc.service_id), guides.get(svc.service_id)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    return {"mode": mode, "boot_ms": round(elapsed_ms, 2), "rss_delta_kib": _rss_kib() - rss_before}
+
+
+def report() -> List[Dict[str, Any]]:
+    """Run one fresh interpreter per loading mode and collect its figures."""
+    results = []
+    for mode in ("source", "snapshot"):
+        out = subprocess.run(
+            [sys.executable, "-m", "app.snapshot", "_probe", mode],
+            cwd=Path(__file__).resolve().parents[1],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        results.append(json.loads(out.stdout))
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    cmd = argv[0] if argv else "build"
+
+    if cmd == "build":
+        t0 = time.perf_counter()
+        path = build_snapshot(Path(argv[1]) if len(argv) > 1 else None)
+        print(f"Wrote {path} ({path.stat().st_size} bytes) in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        return 0
+
+    if cmd == "status":
+        path = Path(settings.snapshot_path)
+        if not path.exists():
+            print(f"No snapshot at {path}; workers read the source files.")
+            return 1
+        snap = Snapshot(path)
+        stale = snap.stale_sources()
+        print(f"{path}: built {snap.meta.get('built_at')}, {snap.meta.get('service_count')} services")
+        if stale:
+            print(f"STALE ({', '.join(stale)} changed); workers read the source files until it is rebuilt.")
+            return 1
+        print("Up to date with the source files.")
+        return 0
+
+    if cmd == "report":
+        if not Path(settings.snapshot_path).exists():
+            print("No snapshot found; run `python -m app.snapshot build` first.")
+            return 1
+        for row in report():
+            print(f"{row['mode']:>8}: boot {row['boot_ms']:8.2f} ms, rss +{row['rss_delta_kib']} KiB per worker")
+        return 0
+
+    if cmd == "_probe":
+        print(json.dumps(_probe(argv[1])))
+        return 0
+
+    print("usage: python -m app.snapshot [build [PATH] | status | report]")
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
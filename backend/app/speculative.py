@@ -0,0 +1,213 @@
+"""
+Speculative evaluation between /api/intake/parse and /api/intake/evaluate.
+
+The client always calls evaluate right after parse, usually with the
+profile parse returned, yet matching, rules and the LLM explanations only
+started once the second request arrived.  Now parse hands the extracted
+CaseProfile to `speculative.start()`, which runs `compute_evaluation()` in
+a small background pool:
+
+- results are keyed by a hash of the profile's canonical JSON, so evaluate
+  with an unchanged profile finds the result ready (a hit) or waits for
+  the in-flight computation (a join); an edited profile hashes differently
+  and is evaluated normally (a miss);
+- only the pure part is precomputed.  case_id, the proof package, rollups
+  and the staff feed are done by evaluate itself, so an abandoned intake
+  leaves no trace;
+- the cache is bounded (`speculative_max_entries`, oldest evicted first)
+  and entries expire after `speculative_ttl_seconds`; each is used once;
+- if evaluate arrives while the speculative job is still queued behind the
+  pool, the job is cancelled and evaluate computes inline rather than
+  waiting for the queue; a running job is waited for at most
+  `speculative_join_timeout_seconds` (`join_timeouts`), after which
+  evaluate computes inline (and degrades if the LLM is busy);
+- speculation uses spare LLM capacity only.  It is not started when the
+  admission controller is more than half busy, and every LLM call it makes
+  runs under `admission.optional_work()`: the call only gets a slot while
+  half of `llm_max_in_flight` is free, otherwise the speculation is
+  abandoned (`abandoned_busy`) and evaluate computes normally.  Speculative
+  calls therefore never take the last slots a parse or evaluate request
+  needs.  Speculative results are always full (never rules-only) ones.
+
+The cache lives in each worker process.  With several workers, evaluate
+only benefits when it lands on the worker that served parse; otherwise the
+speculative LLM calls are wasted (they show up as `expired`).  Run a single
+worker per host, or use sticky routing, when that matters.
+
+Hit / join / miss counts are exposed at /api/admin/speculative.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+
+from .admission import Overloaded, admission
+from .config import settings
+from .models import CaseProfile
+from .triage import compute_evaluation
+
+
+def profile_key(profile: CaseProfile) -> str:
+    return hashlib.sha256(
+        orjson.dumps(profile.dict(), option=orjson.OPT_SORT_KEYS)
+    ).hexdigest()
+
+
+class SpeculativeEvaluator:
+    """Bounded, short-lived cache of precomputed evaluations."""
+
+    def __init__(
+        self,
+        enabled: bool,
+        workers: int,
+        max_entries: int,
+        ttl_seconds: float,
+        join_timeout: Optional[float] = None,
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.join_timeout = (
+            settings.speculative_join_timeout_seconds if join_timeout is None else join_timeout
+        )
+        self._workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # key -> (future, expires_at)；插入顺序就是过期顺序
+        self._entries: "OrderedDict[str, Tuple[Future, float]]" = OrderedDict()
+        self._counts = {
+            "started": 0,
+            "skipped_busy": 0,
+            "hits": 0,
+            "joins": 0,
+            "misses": 0,
+            "cancelled_queued": 0,
+            "abandoned_busy": 0,
+            "join_timeouts": 0,
+            "expired": 0,
+            "evicted": 0,
+            "errors": 0,
+        }
+
+    @classmethod
+    def from_settings(cls) -> "SpeculativeEvaluator":
+        return cls(
+            enabled=settings.speculative_eval_enabled,
+            workers=settings.speculative_workers,
+            max_entries=settings.speculative_max_entries,
+            ttl_seconds=settings.speculative_ttl_seconds,
+            join_timeout=settings.speculative_join_timeout_seconds,
+        )
+
+    # ----- internal helpers (call with self._lock held) -----
+
+    def _purge(self, now: float) -> None:
+        while self._entries:
+            key, (future, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+            future.cancel()  # 还没开始跑的就不跑了
+            self._counts["expired" if expires_at <= now else "evicted"] += 1
+
+    @staticmethod
+    def _compute(profile: CaseProfile) -> Dict[str, Any]:
+        # 只用空闲的 LLM 容量；拿不到 slot 就放弃（Overloaded），不退化成规则模板
+        with admission.optional_work():
+            return compute_evaluation(profile, degraded=False)
+
+    # ----- public API -----
+
+    def start(self, profile: CaseProfile) -> None:
+        """Begin computing the evaluation for a freshly parsed profile."""
+        if not self.enabled:
+            return
+        if not admission.has_spare_capacity():
+            with self._lock:
+                self._counts["skipped_busy"] += 1
+            return
+
+        key = profile_key(profile)
+        now = time.monotonic()
+        with self._lock:
+            if key in self._entries:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._workers, thread_name_prefix="speculative-eval"
+                )
+            future = self._executor.submit(self._compute, profile)
+            self._entries[key] = (future, now + self.ttl_seconds)
+            self._counts["started"] += 1
+            self._purge(now)
+
+    def take(self, profile: CaseProfile) -> Optional[Dict[str, Any]]:
+        """
+        The precomputed evaluation for `profile`, waiting up to
+        `join_timeout` seconds if it is still running; None when there is
+        none, it failed or it did not finish in time.
+        """
+        if not self.enabled:
+            return None
+        key = profile_key(profile)
+        with self._lock:
+            self._purge(time.monotonic())
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self._counts["misses"] += 1
+                return None
+            future = entry[0]
+            if future.cancel():
+                # 还在线程池队列里排队：不等它，由 evaluate 自己算
+                self._counts["cancelled_queued"] += 1
+                return None
+            self._counts["hits" if future.done() else "joins"] += 1
+
+        try:
+            return future.result(timeout=self.join_timeout)
+        except FutureTimeoutError:
+            # 推测的 LLM 调用卡住了：不陪它等，evaluate 自己算（LLM 忙时会 degrade）；
+            # 后台那份算完之后直接丢掉
+            with self._lock:
+                self._counts["join_timeouts"] += 1
+            return None
+        except Overloaded:
+            with self._lock:
+                self._counts["abandoned_busy"] += 1
+            return None
+        except Exception:
+            # 推测执行失败就按正常流程重新算一遍
+            with self._lock:
+                self._counts["errors"] += 1
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            cached = len(self._entries)
+        lookups = counts["hits"] + counts["joins"] + counts["misses"] + counts["cancelled_queued"]
+        # 失败、被放弃或等超时的推测结果虽然算进了 hits / joins，但没有用上
+        used = (
+            counts["hits"] + counts["joins"]
+            - counts["errors"] - counts["abandoned_busy"] - counts["join_timeouts"]
+        )
+        return {
+            "enabled": self.enabled,
+            "cached": cached,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            **counts,
+            "hit_rate": round(used / lookups, 3) if lookups else None,
+        }
+
+
+# 每个 worker 进程一个
+speculative = SpeculativeEvaluator.from_settings()
@@ -0,0 +1,254 @@
+"""
+Triage pipeline shared by the HTTP routers and the command-line tools.
+
+- cached reference data (services, rules, guides, priority config), read
+  from the mmap'd snapshot when one is built;
+- follow-up questions for a freshly parsed CaseProfile;
+- `compute_evaluation()`: match services, run rules, compute the ticket
+  priority (pure, so it can run speculatively);
+- `finalize_evaluation()`: write the proof package, update the dashboard
+  rollups, push the case to the staff feed and return the encoded
+  response body; `evaluate_profile()` does both.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+import orjson
+
+from .admission import admission
+from .case_feed import case_feed
+from .config import LOG_DIR
+from .models import CaseProfile
+from .proof_archive import hot_path
+from .rollups import rollups
+from .rules_engine import (
+    load_rules,
+    load_program_guides,
+    load_priority_config,
+    evaluate_service,
+    compute_ticket_priority,
+)
+from .service_matcher import load_services, match_services
+from .snapshot import current_snapshot, sources_version
+
+logger = logging.getLogger(__name__)
+
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+# 有 reference snapshot（python -m app.snapshot build）时优先从 mmap 读取，
+# 多个 worker 共享同一份页缓存；没有 snapshot 或源文件改过之后退回到直接
+# 解析源文件，源文件再变（sources_version 变化）就重新解析。
+_source_cache: Dict[str, Any] = {}
+_source_cache_version = None
+
+_LOADERS = {
+    "services": load_services,
+    "rules": load_rules,
+    "guides": load_program_guides,
+    "priority": load_priority_config,
+}
+
+
+def _from_sources(name: str):
+    global _source_cache_version
+    version = sources_version()
+    if version != _source_cache_version:
+        _source_cache.clear()
+        _source_cache_version = version
+    if name not in _source_cache:
+        _source_cache[name] = _LOADERS[name]()
+    return _source_cache[name]
+
+
+def get_services():
+    snap = current_snapshot()
+    return snap.services() if snap is not None else _from_sources("services")
+
+
+def get_rules():
+    snap = current_snapshot()
+    return snap.rules() if snap is not None else _from_sources("rules")
+
+
+def get_guides():
+    snap = current_snapshot()
+    return snap.guides() if snap is not None else _from_sources("guides")
+
+
+def get_priority_config():
+    snap = current_snapshot()
+    return snap.priority_config() if snap is not None else _from_sources("priority")
+
+
+def follow_up_questions(profile: CaseProfile) -> List[str]:
+    """还需要追问哪些关键信息（/api/intake/parse 返回给前端）。"""
+    questions: List[str] = []
+
+    # 省份缺失 → 追问
+    if not profile.province:
+        questions.append("In which province or territory do you live?")
+
+    # 失业但不知道 insurable hours → 追问
+    if (
+        profile.employment_status == "unemployed"
+        and profile.insurable_hours_last_52_weeks is None
+    ):
+        questions.append(
+            "Roughly how many insurable hours did you work in the last 52 weeks?"
+        )
+
+    # 没有任何 children 信息 → 追问
+    if profile.children_count == 0:
+        questions.append(
+            "Do you have any children under 18 living with you?"
+        )
+
+    # 有孩子，但不清楚是不是单亲 → 温和追问
+    if (
+        profile.children_count
+        and profile.children_count > 0
+        and profile.is_single_parent is None
+    ):
+        questions.append(
+            "Are you the only adult primarily caring for the children (a single parent)?"
+        )
+
+    return questions
+
+
+def compute_evaluation(profile: CaseProfile, degraded: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    用 CaseProfile 匹配服务、跑规则（含 LLM 解释），计算统一 ticket priority。
+
+    只依赖 profile 本身、没有副作用（不分配 case_id、不写文件），所以可以在
+    /api/intake/parse 之后提前算好（见 app/speculative.py）。
+
+    degraded=None 时由 admission controller 决定是否进入 rules-only 模式；
+    批量导入等调用方可以显式传 False/True。
+    """
+    if degraded is None:
+        degraded = admission.should_degrade()
+
+    services = get_services()
+    rules = get_rules()
+    guides = get_guides()
+
+    matched = match_services(profile, services)
+
+    evaluated = []
+    for s in matched:
+        rule_cfg = rules.get(s.service_id)
+        if not rule_cfg:
+            # 没有对应规则就跳过
+            continue
+        result = evaluate_service(profile, s, rule_cfg, guides, use_llm=not degraded)
+        evaluated.append((s, rule_cfg, result))
+
+    # 统一的 ticket-level priority（“ML 风格”打分器）；need_more_info 也算进去，所以放在规则之后
+    ticket_priority = compute_ticket_priority(
+        profile,
+        get_priority_config(),
+        [result["eligibility_status"] for _, _, result in evaluated],
+    )
+    priority_score = ticket_priority["score"]
+    priority_reasons = ticket_priority["reasons"]
+
+    # 直接构建 plain dict（字段与 ServiceRecommendation 一致），省掉 pydantic 对象和 .dict()
+    recs: List[Dict[str, Any]] = []
+
+    for s, rule_cfg, result in evaluated:
+        guide = result.get("guide") or {}
+
+        # 规则触发信息 & 对应法条 section
+        fired = result.get("fired_rules") or []
+        act_sections = [r.get("section") for r in fired if r.get("section")]
+        rule_ids = [r.get("id") for r in fired if r.get("id")]
+
+        recs.append(
+            {
+                "service_id": s.service_id,
+                "service_name": (
+                    s.service_name_en
+                    if profile.preferred_language == "en"
+                    else s.service_name_fr
+                ),
+                "eligibility_status": result["eligibility_status"],
+                "explanation_client": result.get("client_explanation", ""),
+                "explanation_staff": result.get("staff_explanation", ""),
+                "explanation_source": result.get("explanation_source", "template"),
+                "priority_score": priority_score,
+                # 每个推荐都带同一个统一 ticket priority
+                "ticket_priority": ticket_priority,
+                "required_documents": guide.get("required_documents_en", []),
+                "open_data_sources": {
+                    "service_id": s.service_id,
+                    "program_id": rule_cfg.get("program_group"),
+                    "rule_ids": rule_ids,
+                    "act_sections": act_sections,
+                    "priority_reasons": priority_reasons,
+                },
+            }
+        )
+
+    return {
+        "recommendations": recs,
+        "ticket_priority": ticket_priority,
+        # 没拿到 slot 而退回模板的解释也算 degraded，不能只看开始时的判断
+        "degraded_mode": degraded
+        or any(rec["explanation_source"] == "template" for rec in recs),
+    }
+
+
+def finalize_evaluation(profile: CaseProfile, evaluation: Dict[str, Any]) -> bytes:
+    """
+    给 compute_evaluation() 的结果分配 case_id，写 proof package，
+    更新 rollups、推送 staff feed。
+
+    Response 只构建一次、用 orjson 编码一次：返回的 bytes 同时就是 proof
+    package 的文件内容和 HTTP body。
+    """
+    # 把“证据包”写成 JSON 文件，方便以后审计；proof package 就是 response body 本身
+    case_id = f"CASE-{uuid4()}"
+    created = datetime.now(timezone.utc)
+    package = {
+        "case_id": case_id,
+        "proof_package_id": case_id,
+        # archive / retention 按创建时间分段
+        "created_at": created.isoformat(timespec="seconds"),
+        "case_profile": profile.dict(),
+        "recommendations": evaluation["recommendations"],
+        "ticket_priority": evaluation["ticket_priority"],
+        "degraded_mode": evaluation["degraded_mode"],
+    }
+    body = orjson.dumps(package)
+
+    # 先写临时文件再 rename：staff 查询 / compact / rollups rebuild 永远看不到写了一半的 package
+    path = hot_path(case_id)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(body)
+    os.replace(tmp, path)
+    # proof package 已经落盘，case 就算建好了：dashboard 计数和 staff feed
+    # 出错（比如 rollups.json 坏了、磁盘满了）只记日志，不能让 evaluate 变成 500
+    try:
+        # dashboard 计数增量更新，不用再扫描 logs/
+        rollups.record(package, created)
+    except Exception:
+        logger.exception("Could not update rollups for %s", case_id)
+    try:
+        # 推给订阅了 /api/staff/feed 的 staff 客户端：订阅者可能连在别的 worker 上，
+        # 所以每个 case 都要往共享日志追加一行（共享锁 + 一次 O_APPEND 写）
+        case_feed.publish_case(package)
+    except Exception:
+        logger.exception("Could not publish %s to the case feed", case_id)
+    return body
+
+
+def evaluate_profile(profile: CaseProfile, degraded: Optional[bool] = None) -> bytes:
+    """compute_evaluation() + finalize_evaluation(); returns the response body."""
+    return finalize_evaluation(profile, compute_evaluation(profile, degraded))
@@ -0,0 +1,209 @@
+"""
+Compare the old and new serialization paths of /api/intake/evaluate and
+/api/staff/case/{case_id}.
+
+old evaluate: ServiceRecommendation objects -> .dict() -> json.dump(indent=2)
+              for the proof package, then response_model validation +
+              jsonable_encoder + json.dumps for the HTTP body
+new evaluate: plain dicts -> one orjson.dumps, same bytes for file + body
+
+old staff:    read the stored (pretty-printed) file -> json.loads -> json.dumps
+              for the HTTP body
+new staff:    read the stored (compact) file; its bytes are the body
+
+Both staff paths read a real file from a temporary directory, so the
+numbers include the open/read that the endpoint does.
+
+For each path it reports CPU time per request, the peak of traced memory
+during one request, and the number of memory blocks allocated by one
+request (from tracemalloc snapshot statistics; see `_allocated_blocks`).
+
+Run from backend/:
+
+    python -m benchmarks.bench_serialization
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from app.models import CaseProfile, EvaluationResponse, ServiceRecommendation
+
+ITERATIONS = 5000
+
+
+def _sample() -> Dict[str, Any]:
+    profile = CaseProfile(
+        age=34,
+        province="NS",
+        employment_status="unemployed",
+        unemployment_reason="layoff",
+        children_count=2,
+        youngest_child_age=4,
+        is_single_parent=True,
+        preferred_language="fr",
+        insurable_hours_last_52_weeks=900,
+        residency_status="canadian_resident",
+    )
+    ticket_priority = {
+        "score": 1.0,
+        "band": "high",
+        "requires_human_review": True,
+        "reasons": ["Imminent income loss", "Caring for children", "Single parent caring for children"],
+    }
+    recs = []
+    for service_id, section in (("EI_REGULAR", "Employment Insurance Act s.7"), ("CCB", "Income Tax Act s.122.61")):
+        recs.append(
+            {
+                "service_id": service_id,
+                "service_name": f"Prestation {service_id}",
+                "eligibility_status": "eligible",
+                "explanation_client": "Selon les renseignements fournis, vous pourriez être admissible. " * 3,
+                "explanation_staff": f"Service: {service_id}. Rule x from {section} fired with outcome 'eligible'.",
+                "priority_score": 1.0,
+                "ticket_priority": ticket_priority,
+                "required_documents": ["Social Insurance Number (SIN)", "Record of Employment (ROE)"],
+                "open_data_sources": {
+                    "service_id": service_id,
+                    "program_id": "income_support",
+                    "act_sections": [section],
+                    "priority_reasons": ticket_priority["reasons"],
+                },
+            }
+        )
+    return {"profile": profile, "recs": recs, "ticket_priority": ticket_priority}
+
+
+def old_evaluate(sample: Dict[str, Any]) -> bytes:
+    profile = sample["profile"]
+    recs = [ServiceRecommendation(**r) for r in sample["recs"]]
+    proof = {
+        "case_id": "CASE-bench",
+        "case_profile": profile.dict(),
+        "recommendations": [r.dict() for r in recs],
+        "ticket_priority": sample["ticket_priority"],
+    }
+    f = io.StringIO()
+    json.dump(proof, f, ensure_ascii=False, indent=2)
+
+    response = EvaluationResponse(
+        case_profile=profile,
+        recommendations=recs,
+        proof_package_id="CASE-bench",
+        ticket_priority=sample["ticket_priority"],
+    )
+    # FastAPI: response_model re-validation + jsonable_encoder + JSONResponse.render
+    # （和代码库其它地方一样走 .dict()）
+    validated = EvaluationResponse(**response.dict())
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False).encode("utf-8")
+
+
+def new_evaluate(sample: Dict[str, Any]) -> bytes:
+    body = orjson.dumps(
+        {
+            "case_id": "CASE-bench",
+            "proof_package_id": "CASE-bench",
+            "created_at": "2025-01-01T00:00:00+00:00",
+            "case_profile": sample["profile"].dict(),
+            "recommendations": sample["recs"],
+            "ticket_priority": sample["ticket_priority"],
+            "degraded_mode": False,
+        }
+    )
+    io.BytesIO().write(body)
+    return body
+
+
+def _allocated_blocks(fn: Callable[[], Any]) -> int:
+    """
+    Memory blocks allocated by one call of `fn`, counted with tracemalloc.
+
+    tracemalloc only sees blocks that are still alive when the snapshot is
+    taken, so while `fn` runs every Python frame's locals and return value
+    are kept alive until the snapshot; the count is the number of blocks in
+    the snapshot that were not there before the call.  Temporaries that
+    never reach a Python variable (e.g. inside C encoders) are not counted,
+    so this is a lower bound, and the same for the old and new paths.
+    """
+    kept: List[Any] = []
+
+    def keep(frame, event, arg):
+        if event == "return":
+            kept.append((dict(frame.f_locals), arg))
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sys.setprofile(keep)
+    try:
+        result = fn()
+    finally:
+        sys.setprofile(None)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    # 不算 profiler 自己的 kept 列表和 tuple
+    filters = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+    diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), "filename")
+    del kept, result
+    return sum(max(stat.count_diff, 0) for stat in diff)
+
+
+def _measure(fn: Callable[[], Any]) -> Dict[str, float]:
+    fn()  # warm up
+    t0 = time.process_time()
+    for _ in range(ITERATIONS):
+        fn()
+    cpu_us = (time.process_time() - t0) / ITERATIONS * 1e6
+
+    # 单次请求里同时存活的临时分配峰值
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"cpu_us": cpu_us, "peak_kib": peak / 1024, "blocks": _allocated_blocks(fn)}
+
+
+def old_staff(path: Path) -> bytes:
+    with path.open(encoding="utf-8") as f:
+        proof = json.load(f)
+    return json.dumps(proof, ensure_ascii=False).encode("utf-8")
+
+
+def new_staff(path: Path) -> bytes:
+    return path.read_bytes()
+
+
+def main() -> None:
+    sample = _sample()
+    with tempfile.TemporaryDirectory() as tmp:
+        stored_pretty = Path(tmp) / "proof_pretty.json"
+        stored_pretty.write_text(
+            json.dumps(json.loads(new_evaluate(sample)), ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+        stored_compact = Path(tmp) / "proof_compact.json"
+        stored_compact.write_bytes(new_evaluate(sample))
+
+        rows: List[tuple] = [
+            ("evaluate  old", lambda: old_evaluate(sample)),
+            ("evaluate  new", lambda: new_evaluate(sample)),
+            ("staff     old", lambda: old_staff(stored_pretty)),
+            ("staff     new", lambda: new_staff(stored_compact)),
+        ]
+        print(f"{'path':<15}{'cpu us/req':>12}{'peak alloc KiB':>16}{'alloc blocks':>14}")
+        for name, fn in rows:
+            m = _measure(fn)
+            print(f"{name:<15}{m['cpu_us']:>12.1f}{m['peak_kib']:>16.1f}{m['blocks']:>14}")
+
+
+if __name__ == "__main__":
+    main()
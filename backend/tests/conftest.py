@@ -0,0 +1,5 @@
+import os
+
+# 测试不连 OpenAI：llm_client 在 import 时选 client，必须最先设置
+os.environ.setdefault("FAIRROUTE_LLM_STUB", "1")
+os.environ.setdefault("FAIRROUTE_LLM_STUB_LATENCY", "0")
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.admission import AdmissionController, Overloaded
+from app.main import app
+from app.models import CaseProfile
+from app.triage import compute_evaluation
+
+
+def controller(**overrides):
+    params = dict(
+        max_in_flight=2, max_queue=1, queue_timeout=1, degrade_latency=30, latency_window=60, retry_after=7
+    )
+    params.update(overrides)
+    return AdmissionController(**params)
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    ctl = controller()
+    for module in ("app.admission", "app.triage", "app.llm_client"):
+        monkeypatch.setattr(f"{module}.admission", ctl)
+    return ctl
+
+
+def test_queue_is_bounded():
+    ctl = controller(max_in_flight=1, max_queue=1)
+
+    async def scenario():
+        async with ctl.slot():
+            waiting = asyncio.create_task(ctl.slot().__aenter__())
+            await asyncio.sleep(0.01)
+            assert ctl.stats()["queued"] == 1
+            with pytest.raises(Overloaded) as shed:
+                async with ctl.slot():
+                    pass
+            assert shed.value.retry_after == 7
+        # 第一个 slot 放出来后排队的请求拿到它
+        await waiting
+        assert ctl.stats()["in_flight"] == 1
+
+    asyncio.run(scenario())
+    assert ctl.stats()["shed_count"] == 1
+
+
+def test_queued_request_times_out():
+    ctl = controller(max_in_flight=1, queue_timeout=0.1)
+
+    async def scenario():
+        async with ctl.slot():
+            with pytest.raises(Overloaded, match="Timed out"):
+                async with ctl.slot():
+                    pass
+
+    asyncio.run(scenario())
+    assert ctl.stats()["queued"] == 0
+
+
+def test_slow_provider_is_shed_until_the_window_passes():
+    ctl = controller(degrade_latency=0.01, latency_window=0.2)
+    with ctl.try_slot() as admitted:
+        assert admitted
+        time.sleep(0.03)
+
+    assert ctl.stats()["provider_slow"] is True
+    assert ctl.should_degrade() is True
+    with pytest.raises(Overloaded, match="slowly"):
+        asyncio.run(ctl.slot().__aenter__())
+
+    # 窗口内没有新样本 → 放行一次去试探
+    time.sleep(0.25)
+    assert ctl.should_degrade() is False
+
+
+def test_should_degrade_when_slots_are_full():
+    ctl = controller()
+    assert ctl.should_degrade() is False
+    with ctl.try_slot() as a, ctl.try_slot() as b:
+        assert a and b
+        assert ctl.should_degrade() is True
+    assert ctl.should_degrade() is False
+    assert ctl.stats()["degraded_count"] == 1
+
+
+def test_exhausted_slots_mark_the_evaluation_degraded(admission):
+    profile = CaseProfile(employment_status="unemployed", children_count=2, is_single_parent=True)
+
+    normal = compute_evaluation(profile, degraded=False)
+    assert normal["recommendations"]
+    assert normal["degraded_mode"] is False
+    assert {r["explanation_source"] for r in normal["recommendations"]} == {"llm"}
+
+    with admission.try_slot() as a, admission.try_slot() as b:
+        assert a and b
+        starved = compute_evaluation(profile, degraded=False)
+
+    assert starved["degraded_mode"] is True
+    assert {r["explanation_source"] for r in starved["recommendations"]} == {"template"}
+    assert admission.stats()["explanation_fallback_count"] == len(starved["recommendations"])
+
+
+def test_parse_is_shed_with_retry_after(admission):
+    admission.max_queue = 0
+    client = TestClient(app)
+
+    with admission.try_slot() as a, admission.try_slot() as b:
+        assert a and b
+        resp = client.post("/api/intake/parse", json={"text": "I lost my job last week."})
+
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "7"
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from app import analytics_export  # noqa: E402
+from app.config import settings  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def analytics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "analytics_dir", str(tmp_path / "analytics"))
+    return tmp_path / "analytics"
+
+
+def packages(start, n):
+    created = datetime(2025, 1, 31, 12, tzinfo=timezone.utc)
+    return [
+        (
+            created,
+            {
+                "case_id": f"CASE-{i}",
+                "created_at": created.isoformat(),
+                "case_profile": {"preferred_language": "en", "province": "NS"},
+                "recommendations": [{"service_id": "EI_REGULAR", "eligibility_status": "eligible"}],
+                "ticket_priority": {"band": "high", "score": 0.9},
+            },
+        )
+        for i in range(start, start + n)
+    ]
+
+
+def test_back_to_back_exports_do_not_collide(monkeypatch):
+    # 两次运行落在同一秒里
+    monkeypatch.setattr(analytics_export, "_stamp", lambda: "20250131T120000")
+
+    first = analytics_export.export(packages(0, 3))
+    second = analytics_export.export(packages(3, 2))
+    compacted = analytics_export.compact()
+    again = analytics_export.export(packages(5, 1))
+
+    assert (first["cases"], second["cases"], again["cases"]) == (3, 2, 1)
+    assert compacted == {"partitions_compacted": 1, "parts_merged": 2}
+    ids = analytics_export.scan(columns=["case_id"]).column("case_id").to_pylist()
+    assert sorted(ids) == [f"CASE-{i}" for i in range(6)]
+
+
+def test_recover_never_replaces_a_registered_part():
+    analytics_export.export(packages(0, 2))
+    part = next(analytics_export.dataset_dir().glob("**/*.parquet"))
+    committed = part.read_bytes()
+    stray = analytics_export._tmp_path(part)
+    stray.write_bytes(b"not parquet")
+
+    conn = analytics_export._connect()
+    try:
+        analytics_export._recover(conn)
+    finally:
+        conn.close()
+
+    assert part.read_bytes() == committed
+    assert not stray.exists()
+
+
+def test_scan_ignores_unfinished_parts():
+    analytics_export.export(packages(0, 3))
+    part = next(analytics_export.dataset_dir().glob("**/*.parquet"))
+    # 模拟另一个 export 正在写、还没 rename 的 part
+    analytics_export._tmp_path(part).write_bytes(part.read_bytes())
+
+    assert analytics_export.scan(columns=["case_id"]).num_rows == 3
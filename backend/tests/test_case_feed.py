@@ -0,0 +1,106 @@
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+from app.case_feed import ROTATED_LOGS, CaseFeed
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def summary(case_id, band="high", service_id="EI_REGULAR"):
+    return {"case_id": case_id, "band": band, "services": [{"service_id": service_id}]}
+
+
+async def receive(sub, n, timeout=5.0):
+    return [await asyncio.wait_for(sub.next_text(), timeout) for _ in range(n)]
+
+
+def test_events_from_another_process_are_delivered(tmp_path):
+    feed = CaseFeed(buffer_size=16, log_path=tmp_path / "feed.jsonl", poll_seconds=0.01)
+    script = (
+        "import sys\n"
+        "from app.case_feed import CaseFeed\n"
+        "feed = CaseFeed(buffer_size=16, log_path=sys.argv[1])\n"
+        "feed.publish('case.created', {'case_id': 'CASE-other', 'band': 'high', 'services': []})\n"
+    )
+
+    async def scenario():
+        sub = feed.subscribe()
+        await asyncio.sleep(0.05)
+        subprocess.run([sys.executable, "-c", script, str(feed.log_path)], cwd=BACKEND_DIR, check=True)
+        feed.publish("case.created", summary("CASE-here"))
+        texts = await receive(sub, 2)
+        feed.unsubscribe(sub)
+        return texts
+
+    texts = asyncio.run(scenario())
+    assert '"CASE-other"' in texts[0]
+    assert '"CASE-here"' in texts[1]
+
+
+def test_filters_and_rotation(tmp_path):
+    feed = CaseFeed(buffer_size=64, log_path=tmp_path / "feed.jsonl", poll_seconds=0.01, max_log_bytes=300)
+
+    async def scenario():
+        sub = feed.subscribe(bands={"high"}, services={"CCB"})
+        await asyncio.sleep(0.05)
+        for i in range(20):
+            feed.publish("case.created", summary(f"CASE-{i}", service_id="CCB" if i % 2 else "EI_REGULAR"))
+            await asyncio.sleep(0.005)
+        feed.publish("case.created", summary("CASE-low", band="low", service_id="CCB"))
+        texts = await receive(sub, 10)
+        feed.unsubscribe(sub)
+        return texts
+
+    texts = asyncio.run(scenario())
+    assert [t.split('"case_id":"')[1].split('"')[0] for t in texts] == [f"CASE-{i}" for i in range(1, 20, 2)]
+    assert (tmp_path / "feed.jsonl.1").exists()
+
+
+def test_slow_subscriber_gets_lagged_notice(tmp_path):
+    feed = CaseFeed(buffer_size=2, log_path=tmp_path / "feed.jsonl", poll_seconds=0.01)
+
+    async def scenario():
+        sub = feed.subscribe()
+        await asyncio.sleep(0.05)
+        for i in range(5):
+            feed.publish("case.created", summary(f"CASE-{i}"))
+        while feed.delivered < 5:
+            await asyncio.sleep(0.01)
+        texts = await receive(sub, 3)
+        feed.unsubscribe(sub)
+        return texts
+
+    texts = asyncio.run(scenario())
+    assert texts[0] == '{"type":"feed.lagged","dropped":3}'
+    assert '"CASE-3"' in texts[1] and '"CASE-4"' in texts[2]
+
+
+def test_several_rotations_between_polls_lose_nothing(tmp_path):
+    feed = CaseFeed(buffer_size=64, log_path=tmp_path / "feed.jsonl", poll_seconds=0.3, max_log_bytes=200)
+
+    async def scenario():
+        sub = feed.subscribe()
+        await asyncio.sleep(0.05)
+        # tailer 在睡觉的时候日志轮转了两次：.1、.2 各一代，外加新的当前日志
+        for i in range(7):
+            feed.publish("case.created", summary(f"CASE-{i}"))
+        texts = await receive(sub, 7)
+        feed.unsubscribe(sub)
+        return texts
+
+    texts = asyncio.run(scenario())
+    assert sorted(p.name for p in tmp_path.glob("feed.jsonl.[0-9]*")) == ["feed.jsonl.1", "feed.jsonl.2"]
+    assert [t.split('"case_id":"')[1].split('"')[0] for t in texts] == [f"CASE-{i}" for i in range(7)]
+
+
+def test_rotation_keeps_the_newest_generations(tmp_path):
+    feed = CaseFeed(buffer_size=16, log_path=tmp_path / "feed.jsonl", max_log_bytes=50)
+
+    # 每行都比 max_log_bytes 长：每次 publish 都轮转一次
+    for i in range(3 * ROTATED_LOGS):
+        feed.publish("case.created", summary(f"CASE-{i}"))
+
+    numbers = sorted(int(p.suffix[1:]) for p in tmp_path.glob("feed.jsonl.[0-9]*"))
+    assert numbers == list(range(2 * ROTATED_LOGS + 1, 3 * ROTATED_LOGS + 1))
@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.model_router import (
+    FAST,
+    STRONG,
+    TRIM_MARKER,
+    ModelRouter,
+    estimate_tokens,
+    is_mixed_script,
+    trim_to_budget,
+)
+
+
+@pytest.fixture
+def router():
+    return ModelRouter(
+        fast_model="fast-model",
+        strong_model="strong-model",
+        parse_fast_max_tokens=100,
+        parse_max_input_tokens=200,
+        parse_max_output_tokens=300,
+        explain_max_input_tokens=50,
+        explain_max_output_tokens=120,
+    )
+
+
+def test_estimate_tokens_counts_cjk_characters_one_each():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("我最近失业了") == 6
+    # 中文按字数，其余按 4 个字符一个 token
+    assert estimate_tokens("我失业了 laid off") == 4 + 3
+
+
+def test_is_mixed_script():
+    english = "I was laid off last month and I have two kids, the youngest is 3."
+    chinese = "我最近失业了，有一个孩子，住在多伦多，孩子今年三岁，我需要帮助。"
+
+    assert is_mixed_script(english) is False
+    assert is_mixed_script(chinese) is False
+    assert is_mixed_script("I was laid off last month. " + chinese) is True
+    # 字母太少不算
+    assert is_mixed_script("EI 失业") is False
+
+
+def test_trim_keeps_head_and_tail():
+    text = "START " + "x" * 2000 + " END"
+
+    trimmed, was_trimmed = trim_to_budget(text, 100)
+
+    assert was_trimmed is True
+    assert trimmed.startswith("START")
+    assert trimmed.endswith("END")
+    assert TRIM_MARKER in trimmed
+    assert estimate_tokens(trimmed) <= 100
+    head, tail = trimmed.split(TRIM_MARKER)
+    # 预算的三分之二留给开头
+    assert len(head) > len(tail)
+
+
+def test_trim_leaves_short_text_alone():
+    assert trim_to_budget("short intake", 100) == ("short intake", False)
+
+
+def test_short_single_script_parse_goes_to_the_fast_tier(router):
+    route, text = router.route_parse("I was laid off last month and I have two kids.")
+
+    assert route["tier"] == FAST
+    assert route["model"] == "fast-model"
+    assert route["max_tokens"] == 300
+    assert route["trimmed"] is False
+    assert text == "I was laid off last month and I have two kids."
+
+
+def test_long_or_mixed_parse_goes_to_the_strong_tier(router):
+    long_route, _ = router.route_parse("word " * 120)
+    mixed_route, _ = router.route_parse("I was laid off last month. 我最近失业了，有一个孩子，住在多伦多。")
+
+    assert long_route["tier"] == STRONG
+    assert mixed_route["tier"] == STRONG
+    assert mixed_route["model"] == "strong-model"
+
+
+def test_oversized_parse_input_is_trimmed(router):
+    route, text = router.route_parse("word " * 400)
+
+    assert route["tier"] == STRONG
+    assert route["trimmed"] is True
+    assert route["input_tokens"] <= 200
+    assert TRIM_MARKER in text
+
+
+def test_explain_always_uses_the_fast_tier(router):
+    route, context = router.route_explain("我最近失业了 and need help. " * 40)
+
+    assert route["task"] == "explain"
+    assert route["tier"] == FAST
+    assert route["max_tokens"] == 120
+    assert route["trimmed"] is True
+    assert estimate_tokens(context) <= 50
+
+    empty_route, empty = router.route_explain(None)
+    assert empty == "" and empty_route["trimmed"] is False
+
+
+def test_measure_records_usage_and_errors(router):
+    route, _ = router.route_explain("")
+    with router.measure(route) as call:
+        call["usage"] = SimpleNamespace(prompt_tokens=10, completion_tokens=5)
+    with pytest.raises(RuntimeError):
+        with router.measure(route):
+            raise RuntimeError("provider down")
+
+    tier = router.stats()["tiers"]["explain/fast"]
+    assert tier["calls"] == 2
+    assert tier["errors"] == 1
+    assert (tier["prompt_tokens"], tier["completion_tokens"]) == (10, 5)
@@ -0,0 +1,126 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import proof_archive
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    monkeypatch.setattr(proof_archive, "LOG_DIR", log_dir)
+    monkeypatch.setattr(proof_archive, "ARCHIVE_DIR", log_dir / "archive")
+    monkeypatch.setattr(proof_archive, "INDEX_PATH", log_dir / "archive" / "index.sqlite")
+    return log_dir
+
+
+def write_proof(case_id, age_days, pretty=False):
+    created = datetime.now(timezone.utc) - timedelta(days=age_days)
+    proof = {
+        "case_id": case_id,
+        "created_at": created.isoformat(),
+        "recommendations": [
+            {
+                "service_id": "EI_REGULAR",
+                "eligibility_status": "likely_eligible",
+                "client_explanation": "You may qualify for Employment Insurance regular benefits.",
+            }
+        ],
+        "ticket_priority": {"band": "high", "score": 0.8},
+    }
+    path = proof_archive.hot_path(case_id)
+    path.write_text(json.dumps(proof, indent=2 if pretty else None), encoding="utf-8")
+    ts = created.timestamp()
+    os.utime(path, (ts, ts))
+    return proof
+
+
+def test_compact_round_trip(archive):
+    old = [write_proof(f"CASE-OLD-{i}", age_days=40 + i, pretty=i % 2 == 0) for i in range(5)]
+    write_proof("CASE-NEW", age_days=1)
+
+    result = proof_archive.compact(older_than_days=30)
+
+    assert result["archived"] == 5
+    assert sorted(p.name for p in archive.glob("proof_*.json")) == ["proof_CASE-NEW.json"]
+    for proof in old:
+        assert json.loads(proof_archive.load_proof_bytes(proof["case_id"])) == proof
+    assert json.loads(proof_archive.load_proof_bytes("CASE-NEW"))["case_id"] == "CASE-NEW"
+    assert proof_archive.load_proof_bytes("CASE-MISSING") is None
+
+
+def test_compact_skips_unreadable_files(archive):
+    write_proof("CASE-OK", age_days=40)
+    torn = proof_archive.hot_path("CASE-TORN")
+    torn.write_text('{"case_id": "CASE-TO', encoding="utf-8")
+    ts = (datetime.now(timezone.utc) - timedelta(days=40)).timestamp()
+    os.utime(torn, (ts, ts))
+
+    result = proof_archive.compact(older_than_days=30)
+
+    assert result["archived"] == 1
+    assert torn.exists()
+    assert proof_archive.load_archived_bytes("CASE-OK") is not None
+
+
+def test_compact_rerun_after_crash(archive):
+    proof = write_proof("CASE-A", age_days=40)
+    hot = proof_archive.hot_path("CASE-A")
+    kept = hot.read_bytes()
+    proof_archive.compact(older_than_days=30)
+
+    # 模拟在 index commit 之后、删除 hot 文件之前崩溃
+    hot.write_bytes(kept)
+    ts = (datetime.now(timezone.utc) - timedelta(days=40)).timestamp()
+    os.utime(hot, (ts, ts))
+
+    result = proof_archive.compact(older_than_days=30)
+
+    assert result["archived"] == 0
+    assert not hot.exists()
+    assert json.loads(proof_archive.load_proof_bytes("CASE-A")) == proof
+    assert proof_archive.stats()["archived_count"] == 1
+
+
+def test_expire_drops_old_segments_and_hot_files(archive):
+    write_proof("CASE-ANCIENT", age_days=400)
+    write_proof("CASE-OLD", age_days=40)
+    proof_archive.compact(older_than_days=30)
+    write_proof("CASE-HOT-ANCIENT", age_days=400)
+    write_proof("CASE-NEW", age_days=1)
+
+    result = proof_archive.expire(retention_days=365)
+
+    assert result == {"removed_hot": 1, "removed_archived": 1, "removed_segments": 1}
+    assert proof_archive.load_proof_bytes("CASE-ANCIENT") is None
+    assert proof_archive.load_proof_bytes("CASE-HOT-ANCIENT") is None
+    assert proof_archive.load_proof_bytes("CASE-OLD") is not None
+    assert proof_archive.load_proof_bytes("CASE-NEW") is not None
+    assert len(list((archive / "archive").glob("*.seg"))) == 1
+
+
+def test_compact_streams_in_batches(archive, monkeypatch):
+    monkeypatch.setattr(proof_archive, "COMPACT_BATCH_SIZE", 2)
+    old = [write_proof(f"CASE-BATCH-{i}", age_days=40) for i in range(5)]
+
+    result = proof_archive.compact(older_than_days=30)
+
+    assert result["archived"] == 5
+    # 分批 commit，但同一天仍然只写一个 segment
+    assert len(list((archive / "archive").glob("*.seg"))) == 1
+    for proof in old:
+        assert json.loads(proof_archive.load_proof_bytes(proof["case_id"])) == proof
+
+
+def test_expire_skips_recently_modified_hot_files(archive):
+    write_proof("CASE-TOUCHED", age_days=400)
+    # mtime 在保留期内的文件不打开就跳过
+    os.utime(proof_archive.hot_path("CASE-TOUCHED"))
+
+    result = proof_archive.expire(retention_days=365)
+
+    assert result["removed_hot"] == 0
+    assert proof_archive.hot_path("CASE-TOUCHED").exists()
@@ -0,0 +1,155 @@
+import csv
+import os
+import zipfile
+
+import pytest
+
+from app import reference_data
+from app.config import settings
+from app.reference_data import (
+    INFOBASE_PROGRAM_SCHEMA,
+    SERVICE_INVENTORY_SCHEMA,
+    ColumnTable,
+    build_table,
+    iter_source_rows,
+    load_table,
+)
+
+NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+REL_NS = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    path = tmp_path / "cache"
+    monkeypatch.setattr(settings, "reference_cache_dir", str(path))
+    return path
+
+
+def write_inventory(path, rows):
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        # 源文件的表头和 canonical 列名不一样，要靠 schema 里的别名映射
+        w.writerow(["Service ID Number", "Service Name English", "Service Name French", "Keywords", "Service Type"])
+        w.writerows(rows)
+
+
+def write_xlsx(path, sheets):
+    """Workbook whose first sheet (in workbook order) is stored as the last sheetN.xml part."""
+    parts = {}
+    entries, rels = [], []
+    for n, (name, rows) in enumerate(sheets, start=1):
+        part = len(sheets) - n + 1
+        entries.append(f'<sheet name="{name}" sheetId="{n}" r:id="rId{n}"/>')
+        rels.append(
+            f'<Relationship Id="rId{n}" Target="worksheets/sheet{part}.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        )
+        xml_rows = []
+        for r, row in enumerate(rows, start=1):
+            cells = []
+            for c, value in enumerate(row):
+                ref = f"{chr(65 + c)}{r}"
+                if isinstance(value, (int, float)):
+                    cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+                else:
+                    cells.append(f'<c r="{ref}" t="inlineStr"><is><t>{value}</t></is></c>')
+            xml_rows.append(f'<row r="{r}">{"".join(cells)}</row>')
+        parts[f"xl/worksheets/sheet{part}.xml"] = f'<worksheet {NS}><sheetData>{"".join(xml_rows)}</sheetData></worksheet>'
+    parts["xl/workbook.xml"] = f'<workbook {NS} {REL_NS}><sheets>{"".join(entries)}</sheets></workbook>'
+    parts["xl/_rels/workbook.xml.rels"] = (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'{"".join(rels)}</Relationships>'
+    )
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, xml in parts.items():
+            zf.writestr(name, xml)
+
+
+def test_csv_rows_are_mapped_and_typed(tmp_path):
+    src = tmp_path / "inventory.csv"
+    write_inventory(
+        src,
+        [
+            ["SVC_1", "Employment Insurance", "Assurance-emploi", "benefit, income,", "benefit"],
+            ["SVC_2", "Canada Child Benefit", "Allocation canadienne pour enfants", "family", "benefit"],
+        ],
+    )
+
+    table = build_table(iter_source_rows(src), SERVICE_INVENTORY_SCHEMA)
+
+    assert len(table) == 2
+    assert table.row(0)["service_id"] == "SVC_1"
+    assert table.row(0)["keywords"] == ["benefit", "income"]
+    assert table.row(1)["service_name_fr"] == "Allocation canadienne pour enfants"
+    # 源文件里没有的列是空字符串
+    assert table.column("website_url_en") == ["", ""]
+    # 重复值多的文本列做字典编码
+    assert table._data["service_type"][0] == "dict"
+
+    restored = ColumnTable.from_bytes(table.to_bytes())
+    assert list(restored.iter_rows()) == list(table.iter_rows())
+
+
+def test_xlsx_reads_the_first_sheet_of_the_workbook(tmp_path):
+    src = tmp_path / "programs.xlsx"
+    write_xlsx(
+        src,
+        [
+            (
+                "Programs",
+                [
+                    ["Program ID", "Program Name EN", "Expenditure Millions", "Fiscal Year"],
+                    ["P1", "Employment Insurance", 23456.7, 2023],
+                    ["P2", "Canada Child Benefit", "", "n/a"],
+                ],
+            ),
+            ("Notes", [["Program ID"], ["NOT-A-PROGRAM"]]),
+        ],
+    )
+
+    table = build_table(iter_source_rows(src), INFOBASE_PROGRAM_SCHEMA)
+
+    assert table.column("program_id") == ["P1", "P2"]
+    assert table.row(0)["latest_expenditure_millions"] == pytest.approx(23456.7)
+    assert table.row(0)["latest_year"] == 2023
+    assert table.row(1)["latest_expenditure_millions"] is None
+    assert table.row(1)["latest_year"] is None
+
+
+def test_cache_is_reused_until_the_source_changes(tmp_path, cache_dir, monkeypatch):
+    src = tmp_path / "inventory.csv"
+    write_inventory(src, [["SVC_1", "Employment Insurance", "Assurance-emploi", "benefit", "benefit"]])
+
+    first = load_table(src, SERVICE_INVENTORY_SCHEMA)
+    caches = list(cache_dir.glob("inventory-*.frcol"))
+    assert len(caches) == 1
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError("source re-parsed on a cache hit")
+
+    with monkeypatch.context() as m:
+        m.setattr(reference_data, "build_table", no_parse)
+        assert list(load_table(src, SERVICE_INVENTORY_SCHEMA).iter_rows()) == list(first.iter_rows())
+
+    write_inventory(src, [["SVC_9", "Old Age Security", "Sécurité de la vieillesse", "senior", "benefit"]])
+    st = src.stat()
+    # 保证 mtime 变了，manifest 里记下的旧 hash 不会被复用
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    changed = load_table(src, SERVICE_INVENTORY_SCHEMA)
+    assert changed.column("service_id") == ["SVC_9"]
+    # 旧版本的 cache 被删掉
+    assert [p.name for p in cache_dir.glob("inventory-*.frcol")] != [p.name for p in caches]
+    assert len(list(cache_dir.glob("inventory-*.frcol"))) == 1
+
+
+def test_corrupt_cache_is_rebuilt(tmp_path, cache_dir):
+    src = tmp_path / "inventory.csv"
+    write_inventory(src, [["SVC_1", "Employment Insurance", "Assurance-emploi", "benefit", "benefit"]])
+    load_table(src, SERVICE_INVENTORY_SCHEMA)
+    (cache_path,) = cache_dir.glob("inventory-*.frcol")
+    cache_path.write_bytes(b"garbage")
+
+    assert load_table(src, SERVICE_INVENTORY_SCHEMA).column("service_id") == ["SVC_1"]
+    assert cache_path.read_bytes().startswith(reference_data.CACHE_MAGIC)
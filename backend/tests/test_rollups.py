@@ -0,0 +1,58 @@
+import json
+
+from app import proof_archive, triage
+from app.config import settings
+from app.models import CaseProfile
+from app.rollups import Rollups
+
+
+def package(province):
+    return {
+        "case_profile": {"province": province, "preferred_language": "fr"},
+        "ticket_priority": {"band": "high", "score": 0.5},
+        "recommendations": [{"service_id": "EI_REGULAR", "eligibility_status": "eligible"}],
+    }
+
+
+def test_values_with_slashes_stay_one_segment(tmp_path):
+    r = Rollups(path=tmp_path / "rollups.json", flush_seconds=0)
+    r.record(package("ON/QC"))
+    r.record(package("ON"))
+
+    result = r.query(hours=24)
+
+    assert result["counts"]["province"] == {"ON": 1, "ON/QC": 1}
+    assert result["counts"]["band_by_province"]["high"] == {"ON": 1, "ON/QC": 1}
+
+
+def test_window_is_limited_to_retention(tmp_path):
+    r = Rollups(path=tmp_path / "rollups.json", flush_seconds=0)
+
+    assert r.query(hours=10_000)["window"]["hours"] == settings.rollup_hourly_retention_hours
+    assert r.query(days=10_000)["window"]["days"] == settings.rollup_daily_retention_days
+
+
+def test_corrupt_file_starts_from_empty(tmp_path):
+    path = tmp_path / "rollups.json"
+    path.write_bytes(b'{"totals": {"cases": 3}, "hours": {')
+    r = Rollups(path=path, flush_seconds=0)
+
+    r.record(package("ON"))
+
+    assert r.query(hours=24)["counts"]["province"] == {"ON": 1}
+
+
+def test_rollup_failure_does_not_fail_evaluate(tmp_path, monkeypatch):
+    monkeypatch.setattr(proof_archive, "LOG_DIR", tmp_path)
+    monkeypatch.setattr(triage.case_feed, "log_path", tmp_path / "case_feed.jsonl")
+
+    def broken(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(triage.rollups, "record", broken)
+    profile = CaseProfile(employment_status="unemployed", children_count=1)
+
+    body = triage.evaluate_profile(profile, degraded=True)
+
+    case_id = json.loads(body)["case_id"]
+    assert proof_archive.hot_path(case_id).read_bytes() == body
@@ -1 +1,50 @@
-test_rules_engine.py
\ No newline at end of file
+from app.models import CaseProfile
+from app.rules_engine import compute_ticket_priority, load_priority_config
+
+CFG = load_priority_config()
+
+
+def test_high_band_needs_review():
+    profile = CaseProfile(
+        employment_status="unemployed",
+        children_count=2,
+        is_single_parent=True,
+        residency_status="canadian_resident",
+    )
+
+    priority = compute_ticket_priority(profile, CFG, ["eligible"])
+
+    assert priority["band"] == "high"
+    assert priority["requires_human_review"] is True
+
+
+def test_low_band_settled_case_needs_no_review():
+    profile = CaseProfile(employment_status="employed", residency_status="canadian_resident")
+
+    priority = compute_ticket_priority(profile, CFG, ["eligible"])
+
+    assert priority["band"] == "low"
+    assert priority["requires_human_review"] is False
+
+
+def test_uncertain_residency_needs_review_and_adds_points():
+    settled = CaseProfile(employment_status="employed", residency_status="canadian_resident")
+    uncertain = CaseProfile(employment_status="employed", residency_status="refugee_claimant")
+
+    before = compute_ticket_priority(settled, CFG)
+    after = compute_ticket_priority(uncertain, CFG)
+
+    assert after["requires_human_review"] is True
+    assert after["score"] > before["score"]
+    assert "Residency status is uncertain" in after["reasons"]
+
+
+def test_need_more_info_needs_review_and_adds_points():
+    profile = CaseProfile(employment_status="employed", residency_status="permanent_resident")
+
+    settled = compute_ticket_priority(profile, CFG, ["eligible"])
+    pending = compute_ticket_priority(profile, CFG, ["eligible", "need_more_info"])
+
+    assert settled["requires_human_review"] is False
+    assert pending["requires_human_review"] is True
+    assert pending["score"] > settled["score"]
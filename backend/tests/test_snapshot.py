@@ -0,0 +1,110 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from app import snapshot
+from app.config import settings
+from app.rules_engine import load_program_guides, load_rules
+from app.service_matcher import load_services
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    """Copies of the reference sources (same names, same mtimes) the snapshot fingerprints."""
+    copies = []
+    for src in snapshot.SOURCE_FILES:
+        dst = tmp_path / "sources" / src.name
+        dst.parent.mkdir(exist_ok=True)
+        shutil.copy2(src, dst)
+        copies.append(dst)
+    monkeypatch.setattr(snapshot, "SOURCE_FILES", copies)
+    return {p.name: p for p in copies}
+
+
+@pytest.fixture
+def snap_path(tmp_path, monkeypatch, sources):
+    path = tmp_path / "reference.snap"
+    monkeypatch.setattr(settings, "snapshot_path", str(path))
+    monkeypatch.setattr(settings, "snapshot_recheck_seconds", 0)
+    # 每个测试都从“还没检查过”开始
+    monkeypatch.setattr(snapshot, "_current", None)
+    monkeypatch.setattr(snapshot, "_stale", False)
+    monkeypatch.setattr(snapshot, "_last_check", float("-inf"))
+    snapshot.build_snapshot(path)
+    return path
+
+
+def test_sections_match_the_sources(snap_path):
+    snap = snapshot.Snapshot(snap_path)
+
+    assert dict(snap.rules()) == load_rules()
+    assert dict(snap.guides()) == load_program_guides()
+    services = load_services()
+    assert [s.service_id for s in snap.services()] == [s.service_id for s in services]
+    assert snap.stale_sources() == []
+
+
+def test_lazy_service_decodes_on_first_attribute(snap_path):
+    lazy = snapshot.Snapshot(snap_path).services()[0]
+    expected = load_services()[0]
+
+    assert lazy._service is None
+    assert lazy.service_id == expected.service_id
+    assert lazy._service is None
+    assert lazy.service_name_en == expected.service_name_en
+    assert lazy._service is not None
+    assert lazy.dict() == expected.dict()
+
+
+def test_rows_are_not_retained(snap_path):
+    rules = snapshot.Snapshot(snap_path).rules()
+    key = next(iter(rules))
+
+    first = rules[key]
+    first["mutated"] = True
+
+    assert "mutated" not in rules[key]
+    assert rules.get("NO_SUCH_SERVICE") is None
+
+
+def test_edited_source_disables_the_snapshot(snap_path, sources):
+    assert snapshot.current_snapshot() is not None
+
+    # 只改 mtime、内容不变：还算新鲜
+    os.utime(sources["rules.yaml"], (time.time() + 5, time.time() + 5))
+    assert snapshot.current_snapshot() is not None
+
+    sources["rules.yaml"].write_text(sources["rules.yaml"].read_text(encoding="utf-8") + "\n# edited\n", encoding="utf-8")
+    assert snapshot.current_snapshot() is None
+    assert snapshot.Snapshot(snap_path).stale_sources() == ["rules.yaml"]
+
+    snapshot.build_snapshot(snap_path)
+    assert snapshot.current_snapshot() is not None
+
+
+def test_rebuild_is_picked_up_after_the_recheck_interval(snap_path, monkeypatch):
+    first = snapshot.current_snapshot()
+    monkeypatch.setattr(settings, "snapshot_recheck_seconds", 3600)
+
+    time.sleep(0.01)  # 新文件的 mtime 要不同
+    snapshot.build_snapshot(snap_path)
+    assert snapshot.current_snapshot() is first
+
+    monkeypatch.setattr(snapshot, "_last_check", float("-inf"))
+    assert snapshot.current_snapshot() is not first
+
+
+def test_unsupported_format_version_is_rejected(snap_path, monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(snapshot, "FORMAT_VERSION", snapshot.FORMAT_VERSION + 1)
+        snapshot.build_snapshot(snap_path)
+
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.Snapshot(snap_path)
+
+
+def test_missing_snapshot_falls_back_to_sources(snap_path):
+    snap_path.unlink()
+    assert snapshot.current_snapshot() is None
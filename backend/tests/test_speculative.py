@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from app.admission import AdmissionController
+from app.models import CaseProfile
+from app.speculative import SpeculativeEvaluator
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    controller = AdmissionController(
+        max_in_flight=4, max_queue=4, queue_timeout=1, degrade_latency=30, latency_window=60, retry_after=1
+    )
+    for module in ("app.admission", "app.speculative", "app.llm_client"):
+        monkeypatch.setattr(f"{module}.admission", controller)
+    return controller
+
+
+def profile(age):
+    return CaseProfile(preferred_language="fr", employment_status="unemployed", children_count=1, age=age)
+
+
+def test_take_cancels_a_job_still_queued(admission, monkeypatch):
+    monkeypatch.setenv("FAIRROUTE_LLM_STUB_LATENCY", "0.2")
+    spec = SpeculativeEvaluator(enabled=True, workers=1, max_entries=8, ttl_seconds=30)
+    spec.start(profile(30))
+    spec.start(profile(31))
+
+    started = time.monotonic()
+    assert spec.take(profile(31)) is None
+    assert time.monotonic() - started < 0.1
+    assert spec.take(profile(30))["degraded_mode"] is False
+    assert spec.stats()["cancelled_queued"] == 1
+
+
+def test_speculation_gives_way_to_real_requests(admission, monkeypatch):
+    monkeypatch.setenv("FAIRROUTE_LLM_STUB_LATENCY", "0.1")
+    spec = SpeculativeEvaluator(enabled=True, workers=1, max_entries=8, ttl_seconds=30)
+    spec.start(profile(40))
+    time.sleep(0.02)
+
+    # 两个真实请求占住一半的 slot：推测执行的后续调用拿不到 slot，直接放弃
+    with admission.try_slot() as a, admission.try_slot() as b:
+        assert a and b
+        time.sleep(0.25)
+        assert admission.stats()["in_flight"] <= admission.max_in_flight
+
+    assert spec.take(profile(40)) is None
+    assert spec.stats()["abandoned_busy"] == 1
+    assert admission.stats()["explanation_fallback_count"] == 0
+
+
+def test_take_gives_up_on_a_slow_job(admission, monkeypatch):
+    monkeypatch.setenv("FAIRROUTE_LLM_STUB_LATENCY", "0.3")
+    spec = SpeculativeEvaluator(enabled=True, workers=1, max_entries=8, ttl_seconds=30, join_timeout=0.05)
+    spec.start(profile(50))
+    time.sleep(0.02)
+
+    started = time.monotonic()
+    assert spec.take(profile(50)) is None
+    assert time.monotonic() - started < 0.2
+    assert spec.stats()["join_timeouts"] == 1